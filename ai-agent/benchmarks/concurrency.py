@@ -0,0 +1,94 @@
+"""
+Measure AI agent request throughput as the number of server workers grows.
+
+For each worker count the script starts serve.py on a free port, sends
+/optimize requests from concurrent client threads and reports requests per
+second. Run from the ai-agent directory:
+
+    python benchmarks/concurrency.py --workers 1 2 4 --clients 16
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def wait_ready(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not start")
+
+def make_payload(batch_size):
+    rng = random.Random(42)
+    return json.dumps({"tokens": [{
+        "token_number": i + 1,
+        "age": rng.randint(1, 90),
+        "emergency": rng.random() < 0.05,
+        "waiting_time": rng.uniform(0, 60),
+    } for i in range(batch_size)]})
+
+def client(port, body, deadline, counts, index):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    headers = {"Content-Type": "application/json"}
+    while time.time() < deadline:
+        conn.request("POST", "/optimize", body=body, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        if response.status == 200:
+            counts[index] += 1
+
+def measure(workers, clients, duration, body):
+    port = free_port()
+    env = dict(os.environ, AI_AGENT_WORKERS=str(workers), AI_AGENT_PORT=str(port), AI_AGENT_HOST="127.0.0.1")
+    server = subprocess.Popen([sys.executable, "serve.py"], cwd=AGENT_DIR, env=env)
+    try:
+        wait_ready(port)
+        counts = [0] * clients
+        deadline = time.time() + duration
+        threads = [threading.Thread(target=client, args=(port, body, deadline, counts, i)) for i in range(clients)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return sum(counts) / duration
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+
+    body = make_payload(args.batch_size)
+    print(f"{'workers':>8}{'req/s':>12}{'speedup':>10}")
+    baseline = None
+    for workers in args.workers:
+        rate = measure(workers, args.clients, args.duration, body)
+        baseline = baseline or rate
+        print(f"{workers:>8}{rate:>12.1f}{rate / baseline:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Compare per-request validation and serialization overhead of the untyped
+`data: dict` handlers with the Pydantic request/response models, and of N
+single /priority calls with one compact /priority/batch call.
+
+    python benchmarks/validation.py --requests 2000 --batch-size 200
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from priority import calculate_priority
+from prediction import predict_completion_time
+from schemas import PriorityRequest, PriorityResponse, CompletionRequest, CompletionResponse
+from cache import priority_cache
+from datetime import datetime
+import main as agent
+
+def legacy_app():
+    # The handlers as they were before the typed models
+    app = FastAPI()
+
+    @app.post("/priority")
+    async def priority(data: dict):
+        return {"priority_score": calculate_priority(
+            data["age"], data["emergency"], data["waiting_time"], data.get("token_type", "regular")
+        )}
+
+    @app.post("/predict-completion")
+    async def completion(data: dict):
+        token_time = datetime.fromisoformat(data["token_time"])
+        return {"completion_time": predict_completion_time(
+            token_time, data["position"], data["avg_service_time"]
+        )}
+
+    return app
+
+def timed(label, n, func):
+    start = time.perf_counter()
+    for _ in range(n):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<44}{elapsed / n * 1e6:>10.1f} us/req")
+
+def make_bodies(count):
+    rng = random.Random(7)
+    return [{
+        "age": rng.randint(1, 90),
+        "emergency": rng.random() < 0.05,
+        "waiting_time": round(rng.uniform(0, 60), 2),
+        "token_type": "regular",
+    } for _ in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+    n = args.requests
+
+    body = json.dumps(make_bodies(1)[0])
+    completion_body = json.dumps({"token_time": "2026-01-01T10:00:00", "position": 4, "avg_service_time": 5})
+
+    print("Validation and serialization only")
+    def untyped():
+        data = json.loads(body)
+        json.dumps({"priority_score": calculate_priority(
+            data["age"], data["emergency"], data["waiting_time"], data.get("token_type", "regular"))})
+    def typed():
+        data = PriorityRequest.model_validate_json(body)
+        PriorityResponse(priority_score=calculate_priority(
+            data.age, data.emergency, data.waiting_time, data.token_type)).model_dump_json()
+    def untyped_completion():
+        data = json.loads(completion_body)
+        json.dumps({"completion_time": predict_completion_time(
+            datetime.fromisoformat(data["token_time"]), data["position"], data["avg_service_time"])})
+    def typed_completion():
+        data = CompletionRequest.model_validate_json(completion_body)
+        CompletionResponse(completion_time=predict_completion_time(
+            data.token_time, data.position, data.avg_service_time)).model_dump_json()
+    timed("priority: dict", n, untyped)
+    timed("priority: pydantic", n, typed)
+    timed("predict-completion: dict", n, untyped_completion)
+    timed("predict-completion: pydantic", n, typed_completion)
+
+    print("End to end through FastAPI")
+    with TestClient(legacy_app()) as before, TestClient(agent.app) as after:
+        headers = {"Content-Type": "application/json"}
+        # The typed /priority route also caches results; clear the cache before
+        # each call so the before/after comparison measures validation, not hits
+        def uncached(body):
+            priority_cache.clear()
+            return after.post("/priority", content=body, headers=headers)
+        timed("priority: before", n, lambda: before.post("/priority", content=body, headers=headers))
+        timed("priority: after", n, lambda: uncached(body))
+        timed("priority: after, cache hit", n, lambda: after.post("/priority", content=body, headers=headers))
+
+        bodies = make_bodies(args.batch_size)
+        batch = json.dumps({
+            "age": [b["age"] for b in bodies],
+            "emergency": [b["emergency"] for b in bodies],
+            "waiting_time": [b["waiting_time"] for b in bodies],
+        })
+        singles = [json.dumps(b) for b in bodies]
+        rounds = max(1, n // args.batch_size)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for single in singles:
+                uncached(single)
+        singles_time = (time.perf_counter() - start) / (rounds * args.batch_size)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            after.post("/priority/batch", content=batch, headers=headers)
+        batch_time = (time.perf_counter() - start) / (rounds * args.batch_size)
+        print(f"{'priority per patient: single requests':<44}{singles_time * 1e6:>10.1f} us/patient")
+        print(f"{'priority per patient: compact batch':<44}{batch_time * 1e6:>10.1f} us/patient")
+
+if __name__ == "__main__":
+    main()
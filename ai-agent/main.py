@@ -1,59 +1,168 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
-from priority import calculate_priority
-from prediction import predict_wait, predict_completion_time
-from optimizer import optimize_queue
+from priority import calculate_priority, calculate_priority_batch
+from prediction import predict_wait, predict_wait_batch, predict_completion_time
+from optimizer import optimize_order
+from schemas import (
+    PriorityRequest, PriorityResponse, PriorityBatchRequest, PriorityBatchResponse,
+    WaitRequest, WaitResponse, WaitBatchRequest, WaitBatchResponse,
+    CompletionRequest, CompletionResponse,
+    OptimizeRequest, OptimizeResponse, OptimizeBatchRequest, OptimizeBatchResponse,
+    ProfilingRequest, ProfilingStopRequest, ProfilingStatus,
+)
+from cache import priority_cache, wait_cache, priority_key, wait_key, cache_stats
+from profiling import ProfilingMiddleware, profiler, require_admin
 from datetime import datetime
+import os
+import pool
+
+@asynccontextmanager
+async def lifespan(app):
+    pool.start()
+    yield
+    pool.shutdown()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],
     allow_methods=["*"],
 )
+app.add_middleware(ProfilingMiddleware)
 
 @app.get("/")
 def home():
     return {
         "AI": "Running",
-        "services": ["priority", "predict-wait", "optimize", "predict-completion"]
+        "services": [
+            "priority", "priority/batch", "predict-wait", "predict-wait/batch",
+            "optimize", "optimize/batch", "predict-completion"
+        ],
+        "cache": cache_stats()
     }
 
-@app.post("/priority")
-async def priority(data: dict):
-    return {
-        "priority_score": calculate_priority(
-            data["age"], 
-            data["emergency"], 
-            data["waiting_time"],
-            data.get("token_type", "regular")
+@app.post("/priority", response_model=PriorityResponse)
+async def priority(data: PriorityRequest):
+    # Cache hits are answered on the event loop without a pool round trip
+    key = priority_key(data.age, data.emergency, data.waiting_time, data.token_type)
+    score = priority_cache.get(key)
+    if score is None:
+        score = await pool.run_cpu(
+            calculate_priority,
+            data.age,
+            data.emergency,
+            data.waiting_time,
+            data.token_type
         )
-    }
+        priority_cache.set(key, score)
+    return PriorityResponse(priority_score=score)
 
-@app.post("/predict-wait")
-async def wait(data: dict):
-    time_of_day = datetime.now() if data.get("use_current_time") else None
-    return {
-        "estimated_wait": predict_wait(
-            data["patients_before"], 
-            data["avg_service_time"],
+@app.post("/priority/batch", response_model=PriorityBatchResponse)
+async def priority_batch(data: PriorityBatchRequest):
+    scores = await pool.run_cpu(
+        calculate_priority_batch,
+        data.age,
+        data.emergency,
+        data.waiting_time,
+        data.token_type
+    )
+    return PriorityBatchResponse(priority_scores=scores.tolist())
+
+@app.post("/predict-wait", response_model=WaitResponse)
+async def wait(data: WaitRequest):
+    time_of_day = datetime.now() if data.use_current_time else None
+    key = wait_key(data.patients_before, data.avg_service_time, time_of_day)
+    estimated_wait = wait_cache.get(key)
+    if estimated_wait is None:
+        estimated_wait = await pool.run_cpu(
+            predict_wait,
+            data.patients_before,
+            data.avg_service_time,
             time_of_day
-        ),
-        "unit": "minutes"
-    }
+        )
+        wait_cache.set(key, estimated_wait)
+    return WaitResponse(estimated_wait=estimated_wait)
 
-@app.post("/predict-completion")
-async def completion(data: dict):
-    token_time = datetime.fromisoformat(data["token_time"])
-    return {
-        "completion_time": predict_completion_time(
-            token_time,
-            data["position"],
-            data["avg_service_time"]
+@app.post("/predict-wait/batch", response_model=WaitBatchResponse)
+async def wait_batch(data: WaitBatchRequest):
+    time_of_day = datetime.now() if data.use_current_time else None
+    waits = await pool.run_cpu(
+        predict_wait_batch,
+        data.patients_before,
+        data.avg_service_time,
+        time_of_day
+    )
+    return WaitBatchResponse(estimated_waits=waits.tolist())
+
+@app.post("/predict-completion", response_model=CompletionResponse)
+async def completion(data: CompletionRequest):
+    return CompletionResponse(
+        completion_time=predict_completion_time(
+            data.token_time,
+            data.position,
+            data.avg_service_time
         )
-    }
+    )
+
+@app.post("/optimize", response_model=OptimizeResponse)
+async def optimize(data: OptimizeRequest):
+    tokens = data.tokens
+    if not tokens:
+        return OptimizeResponse(queue=[])
+    order, scores = await pool.run_cpu(
+        optimize_order,
+        [t.token_number for t in tokens],
+        [t.age for t in tokens],
+        [t.emergency for t in tokens],
+        [t.waiting_time for t in tokens],
+        [t.token_type for t in tokens]
+    )
+    return OptimizeResponse(queue=[
+        tokens[i].model_copy(update={"priority": float(scores[i])}) for i in order
+    ])
+
+@app.post("/optimize/batch", response_model=OptimizeBatchResponse)
+async def optimize_batch(data: OptimizeBatchRequest):
+    order, scores = await pool.run_cpu(
+        optimize_order,
+        data.token_number,
+        data.age,
+        data.emergency,
+        data.waiting_time,
+        data.token_type
+    )
+    numbers = [data.token_number[i] for i in order]
+    return OptimizeBatchResponse(token_number=numbers, priority=scores[order].tolist())
+
+# On-demand profiling admin routes (see profiling.py)
+def _profiling_status(profile=None):
+    return ProfilingStatus(armed=profiler.armed, profiles=profiler.profiles, profile=profile)
+
+def _check_route(path):
+    if path not in {route.path for route in app.routes}:
+        raise HTTPException(status_code=400, detail=f"No route matches {path}")
+
+@app.get("/admin/profiling", response_model=ProfilingStatus, dependencies=[Depends(require_admin)])
+def profiling_status():
+    return _profiling_status()
+
+@app.post("/admin/profiling", response_model=ProfilingStatus, dependencies=[Depends(require_admin)])
+def start_profiling(data: ProfilingRequest):
+    _check_route(data.path)
+    profiler.arm(data.path, data.requests)
+    return _profiling_status()
+
+@app.delete("/admin/profiling", response_model=ProfilingStatus, dependencies=[Depends(require_admin)])
+def stop_profiling(data: ProfilingStopRequest):
+    _check_route(data.path)
+    return _profiling_status(profiler.disarm(data.path))
 
-@app.post("/optimize")
-async def optimize(data: dict):
-    return {"queue": optimize_queue(data["tokens"])}
\ No newline at end of file
+@app.get("/admin/profiling/{name}", dependencies=[Depends(require_admin)])
+def download_profile(name: str):
+    path = os.path.join(profiler.output_dir, os.path.basename(name))
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=os.path.basename(name))
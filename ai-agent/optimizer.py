@@ -0,0 +1,12 @@
+import numpy as np
+from priority import calculate_priority_batch
+
+def optimize_order(token_numbers, ages, emergencies, waiting_times, token_types=None):
+    """
+    Return (order, scores): indices sorted by priority score (highest
+    first), keeping token order for equal scores
+    """
+    scores = calculate_priority_batch(ages, emergencies, waiting_times, token_types)
+    # lexsort sorts by the last key first: descending score, then token number
+    order = np.lexsort((np.asarray(token_numbers), -scores))
+    return order, scores
@@ -0,0 +1,51 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+import profiling
+
+# CPU-bound scoring runs here instead of on the event loop, so a slow batch
+# never stalls other requests served by the same worker. Each server worker
+# owns one pool; AI_AGENT_POOL selects "thread" (default) or "process".
+POOL_KIND = os.environ.get("AI_AGENT_POOL", "thread")
+POOL_SIZE = int(os.environ.get("AI_AGENT_POOL_SIZE", "2"))
+
+_executor = None
+
+def _preload():
+    # Import NumPy and the scoring modules once per process, not per request
+    import numpy  # noqa: F401
+    import optimizer  # noqa: F401
+    import prediction  # noqa: F401
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        if POOL_KIND == "process":
+            _executor = ProcessPoolExecutor(POOL_SIZE, initializer=_preload)
+        else:
+            _executor = ThreadPoolExecutor(POOL_SIZE, thread_name_prefix="ai-cpu")
+    return _executor
+
+async def run_cpu(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    call = partial(func, *args, **kwargs)
+    route = profiling.current_route.get()
+    if route is not None and POOL_KIND != "process":
+        call = partial(profiling.sampled, route, call)
+    return await loop.run_in_executor(get_executor(), call)
+
+def start():
+    _preload()
+    executor = get_executor()
+    if POOL_KIND == "process":
+        # Fork the children now so the first request does not pay for it
+        for _ in range(POOL_SIZE):
+            executor.submit(_preload)
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
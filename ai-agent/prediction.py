@@ -23,4 +23,11 @@ def predict_completion_time(token_time, position, avg_service_time):
     """
     estimated_minutes = position * avg_service_time
     completion_time = token_time + timedelta(minutes=estimated_minutes)
-    return completion_time.isoformat()
\ No newline at end of file
+    return completion_time.isoformat()
+
+def predict_wait_batch(patients_before, avg_service_time, time_of_day=None):
+    """
+    Vectorised predict_wait for many queue positions at one time of day
+    """
+    factor = predict_wait(1, 1, time_of_day)
+    return np.round(np.asarray(patients_before, dtype=float) * avg_service_time * factor, 2)
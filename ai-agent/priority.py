@@ -1,6 +1,9 @@
+import numpy as np
+
 def calculate_priority(age, emergency, waiting_time, token_type="regular"):
     """
-    Calculate priority score with multiple factors
+    Calculate priority score with multiple factors; an unknown age (None)
+    gets no age adjustment
     """
     score = 0
     
@@ -8,15 +11,16 @@ def calculate_priority(age, emergency, waiting_time, token_type="regular"):
     if emergency:
         score += 100
     
-    # Senior citizens priority
-    if age >= 65:
-        score += 30
-    elif age >= 50:
-        score += 15
-    
-    # Children priority
-    if age <= 10:
-        score += 25
+    if age is not None:
+        # Senior citizens priority
+        if age >= 65:
+            score += 30
+        elif age >= 50:
+            score += 15
+        
+        # Children priority
+        if age <= 10:
+            score += 25
     
     # Waiting time factor (increases over time)
     score += waiting_time * 3
@@ -28,4 +32,18 @@ def calculate_priority(age, emergency, waiting_time, token_type="regular"):
         score += 0
     
     # Cap the score to prevent overflow
-    return min(score, 200)
\ No newline at end of file
+    return min(score, 200)
+
+def calculate_priority_batch(ages, emergencies, waiting_times, token_types=None):
+    """
+    Vectorised calculate_priority over parallel arrays
+    """
+    # None becomes NaN, which fails every age comparison: no age adjustment
+    ages = np.asarray(ages, dtype=float)
+    score = np.where(np.asarray(emergencies, dtype=bool), 100.0, 0.0)
+    score += np.select([ages >= 65, ages >= 50], [30, 15], 0)
+    score += np.where(ages <= 10, 25, 0)
+    score += np.asarray(waiting_times, dtype=float) * 3
+    if token_types is not None:
+        score += np.where(np.asarray(token_types) == "vip", 50, 0)
+    return np.minimum(score, 200)
@@ -0,0 +1,61 @@
+import hmac
+import os
+import sys
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "shared"))
+
+from sampler import RouteProfiler
+
+# Pool threads running work for a profiled request are sampled, and so is the
+# event loop thread. The event loop also runs this worker's other requests, so
+# its samples go under an EVENT_LOOP_FRAME root frame, apart from the pool
+# samples. State is per worker process, and work sent to a process pool
+# (AI_AGENT_POOL=process) is not sampled.
+
+PROFILE_DIR = os.environ.get("AI_AGENT_PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+PROFILE_INTERVAL = float(os.environ.get("AI_AGENT_PROFILE_INTERVAL", "0.005"))
+ADMIN_TOKEN = os.environ.get("AI_AGENT_ADMIN_TOKEN")
+EVENT_LOOP_FRAME = "[event loop, shared with concurrent requests]"
+
+# Route being profiled by the current request, read by pool.run_cpu
+current_route: ContextVar[Optional[str]] = ContextVar("current_route", default=None)
+
+profiler = RouteProfiler(PROFILE_DIR, PROFILE_INTERVAL)
+
+class ProfilingMiddleware:
+    """
+    Plain ASGI middleware, so unprofiled requests pay one dict check
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not profiler.armed or scope["type"] != "http" or not profiler.begin(scope["path"], EVENT_LOOP_FRAME):
+            return await self.app(scope, receive, send)
+        route = scope["path"]
+        token = current_route.set(route)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_route.reset(token)
+            profiler.end(route, EVENT_LOOP_FRAME)
+
+def sampled(route, call):
+    """
+    Run call on a pool thread with that thread's stack sampled
+    """
+    profiler.sampler.track(route)
+    try:
+        return call()
+    finally:
+        profiler.sampler.untrack(route)
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    # Profiling is disabled unless AI_AGENT_ADMIN_TOKEN is set
+    if not ADMIN_TOKEN or not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
@@ -0,0 +1,118 @@
+from datetime import datetime
+from typing import Annotated, Dict, List, Optional
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+
+# Request and response models for the AI agent routes. Batch requests use
+# compact parallel arrays (one list per field) instead of a list of objects,
+# which keeps bulk payloads small and lets the handlers hand whole columns
+# to NumPy.
+
+# Batch arrays are bounded in length and apply the same per-item bounds as
+# the single-item models
+MAX_BATCH_SIZE = 10000
+Age = Annotated[int, Field(ge=0, le=150)]
+NonNegativeInt = Annotated[int, Field(ge=0)]
+NonNegativeFloat = Annotated[float, Field(ge=0)]
+
+def Batch(item):
+    return Annotated[List[item], Field(max_length=MAX_BATCH_SIZE)]
+
+class PriorityRequest(BaseModel):
+    age: int = Field(ge=0, le=150)
+    emergency: bool
+    waiting_time: float = Field(ge=0)
+    token_type: str = "regular"
+
+class PriorityResponse(BaseModel):
+    priority_score: float
+
+class PriorityBatchRequest(BaseModel):
+    age: Batch(Age)
+    emergency: Batch(bool)
+    waiting_time: Batch(NonNegativeFloat)
+    token_type: Optional[Batch(str)] = None
+
+    @model_validator(mode="after")
+    def same_length(self):
+        _check_lengths(self, ["age", "emergency", "waiting_time", "token_type"])
+        return self
+
+class PriorityBatchResponse(BaseModel):
+    priority_scores: List[float]
+
+class WaitRequest(BaseModel):
+    patients_before: int = Field(ge=0)
+    avg_service_time: float = Field(ge=0)
+    use_current_time: bool = False
+
+class WaitResponse(BaseModel):
+    estimated_wait: float
+    unit: str = "minutes"
+
+class WaitBatchRequest(BaseModel):
+    patients_before: Batch(NonNegativeInt)
+    avg_service_time: float = Field(ge=0)
+    use_current_time: bool = False
+
+class WaitBatchResponse(BaseModel):
+    estimated_waits: List[float]
+    unit: str = "minutes"
+
+class CompletionRequest(BaseModel):
+    token_time: datetime
+    position: int = Field(ge=0)
+    avg_service_time: float = Field(ge=0)
+
+class CompletionResponse(BaseModel):
+    completion_time: str
+
+class QueueToken(BaseModel):
+    # Fields the agent does not use (patient name, status...) are passed through
+    model_config = ConfigDict(extra="allow")
+
+    token_number: int
+    # The backend's tokens carry no age; None gets no age adjustment
+    age: Optional[int] = Field(default=None, ge=0, le=150)
+    emergency: bool = False
+    waiting_time: float = Field(default=0, ge=0)
+    token_type: str = "regular"
+    priority: Optional[float] = None
+
+class OptimizeRequest(BaseModel):
+    tokens: Batch(QueueToken)
+
+class OptimizeResponse(BaseModel):
+    queue: List[QueueToken]
+
+class OptimizeBatchRequest(BaseModel):
+    token_number: Batch(int)
+    age: Batch(Age)
+    emergency: Batch(bool)
+    waiting_time: Batch(NonNegativeFloat)
+    token_type: Optional[Batch(str)] = None
+
+    @model_validator(mode="after")
+    def same_length(self):
+        _check_lengths(self, ["token_number", "age", "emergency", "waiting_time", "token_type"])
+        return self
+
+class OptimizeBatchResponse(BaseModel):
+    token_number: List[int]
+    priority: List[float]
+
+class ProfilingRequest(BaseModel):
+    path: str
+    requests: int = Field(default=50, ge=1, le=1000)
+
+class ProfilingStopRequest(BaseModel):
+    path: str
+
+class ProfilingStatus(BaseModel):
+    armed: Dict[str, int]
+    profiles: List[str]
+    profile: Optional[str] = None
+
+def _check_lengths(model, fields):
+    lengths = {name: len(getattr(model, name)) for name in fields if getattr(model, name) is not None}
+    if len(set(lengths.values())) > 1:
+        raise ValueError(f"array fields must have the same length, got {lengths}")
@@ -0,0 +1,28 @@
+"""
+Production entry point for the AI agent.
+
+    python serve.py
+
+Starts uvicorn with one worker process per CPU core (override with
+AI_AGENT_WORKERS). Each worker imports main.py once, which loads NumPy and
+the scoring modules, and runs CPU-bound handlers on its own pool (see
+pool.py) so the event loop stays free to accept requests.
+"""
+import os
+import uvicorn
+
+def worker_count():
+    configured = os.environ.get("AI_AGENT_WORKERS")
+    if configured:
+        return max(1, int(configured))
+    # Scoring is CPU-bound, so more processes than cores only adds contention
+    return os.cpu_count() or 1
+
+if __name__ == "__main__":
+    uvicorn.run(
+        "main:app",
+        host=os.environ.get("AI_AGENT_HOST", "0.0.0.0"),
+        port=int(os.environ.get("AI_AGENT_PORT", "8000")),
+        workers=worker_count(),
+        log_level=os.environ.get("AI_AGENT_LOG_LEVEL", "warning"),
+    )
@@ -0,0 +1,251 @@
+"""
+Discrete-event simulation of the clinic queue for capacity planning.
+
+Arrivals and service times are replayed from the backend's tokens table
+(falling back to a Poisson clinic day when there is too little history),
+then served by N doctors under a dispatch policy:
+
+    fifo      the backend rule: the lowest waiting token number is called next
+    priority  the waiting patient with the highest calculate_priority score
+
+Consultations only start during opening hours (the hours that see arrivals),
+so patients still waiting at closing time carry over to the next day and
+their waits include the night.
+
+Example, sweeping 1-4 doctors over a month of traffic:
+
+    python simulation.py --days 30 --doctors 1 2 3 4 --policies fifo priority
+"""
+import argparse
+import heapq
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from prediction import predict_wait_batch
+from priority import calculate_priority_batch
+
+DEFAULT_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", "instance", "queue_system.db")
+
+# Matches MINUTES_PER_PATIENT in the backend
+DEFAULT_SERVICE_MINUTES = 5.0
+DEFAULT_OPEN_HOURS = (9, 17)
+MIN_HISTORY_SAMPLES = 30
+PERCENTILES = (50, 90, 95, 99)
+
+def _parse(value):
+    return datetime.fromisoformat(value) if value else None
+
+def to_clinic_time(utc, utc_offset=None):
+    """
+    The backend stores naive UTC timestamps; opening hours and the
+    predict_wait peak hours are clinic clock hours. utc_offset is in hours,
+    None uses this machine's local time zone.
+    """
+    if utc_offset is None:
+        return utc.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    return utc + timedelta(hours=utc_offset)
+
+def load_history(db_path, utc_offset=None):
+    """
+    Read the tokens table and return (hourly_rate, service_minutes):
+    mean arrivals per clinic clock hour over the observed days, and the
+    observed consultation lengths. Either is None when the history is too
+    thin.
+    """
+    if not os.path.exists(db_path):
+        return None, None
+
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute("SELECT created_at, called_at, completed_at, status FROM tokens").fetchall()
+
+    created = [to_clinic_time(_parse(r[0]), utc_offset) for r in rows if r[0]]
+    hourly_rate = None
+    if len(created) >= MIN_HISTORY_SAMPLES:
+        days = len({c.date() for c in created})
+        counts = np.bincount([c.hour for c in created], minlength=24)
+        hourly_rate = counts / days
+
+    service = [
+        (_parse(completed) - _parse(called)).total_seconds() / 60
+        for _, called, completed, status in rows
+        if status == "completed" and called and completed
+    ]
+    service = np.array([s for s in service if s > 0])
+    if len(service) < MIN_HISTORY_SAMPLES:
+        service = None
+
+    return hourly_rate, service
+
+def default_hourly_rate(arrivals_per_hour, open_hours=DEFAULT_OPEN_HOURS):
+    rate = np.zeros(24)
+    rate[open_hours[0]:open_hours[1]] = arrivals_per_hour
+    return rate
+
+def generate_arrivals(rng, days, hourly_rate):
+    """
+    Poisson arrivals following the hourly profile, as sorted minutes from
+    the start of day 0
+    """
+    counts = rng.poisson(np.tile(hourly_rate, days))
+    hour_index = np.repeat(np.arange(days * 24), counts)
+    minutes = hour_index * 60 + rng.random(hour_index.size) * 60
+    return np.sort(minutes)
+
+def sample_service_times(rng, n, service_minutes=None):
+    if service_minutes is None:
+        return rng.exponential(DEFAULT_SERVICE_MINUTES, n)
+    return rng.choice(service_minutes, n)
+
+def next_open_minute(now, open_hours):
+    """
+    now, or the start of the next opening hour when the clinic is closed
+    """
+    if open_hours is None or not open_hours.any():
+        return now
+    hour = int(now // 60)
+    if open_hours[hour % 24]:
+        return now
+    while not open_hours[hour % 24]:
+        hour += 1
+    return hour * 60.0
+
+def simulate(arrivals, service, doctors, policy="fifo", ages=None, emergency=None, open_hours=None):
+    """
+    Serve the arrivals with `doctors` parallel doctors and return
+    (start_minutes, queue_length_at_arrival). With open_hours (24 booleans)
+    no consultation starts while the clinic is closed, so patients still
+    waiting at closing time are seen the next day.
+    """
+    n = arrivals.size
+    start = np.empty(n)
+    queue_length = np.zeros(n, dtype=np.int64)
+    free_at = [0.0] * doctors
+    waiting = []
+    next_arrival = 0
+    clock = 0.0
+
+    while next_arrival < n or waiting:
+        # Several doctors can be free at once; never step back before the
+        # previous dispatch
+        now = max(free_at[0], clock)
+        if not waiting and arrivals[next_arrival] > now:
+            now = arrivals[next_arrival]
+        now = next_open_minute(now, open_hours)
+        while next_arrival < n and arrivals[next_arrival] <= now:
+            queue_length[next_arrival] = len(waiting)
+            waiting.append(next_arrival)
+            next_arrival += 1
+
+        if policy == "fifo" or len(waiting) == 1:
+            chosen = 0
+        else:
+            candidates = np.array(waiting)
+            scores = calculate_priority_batch(
+                ages[candidates], emergency[candidates], now - arrivals[candidates]
+            )
+            # np.argmax returns the first maximum, i.e. the lowest token number
+            chosen = int(np.argmax(scores))
+
+        patient = waiting.pop(chosen)
+        start[patient] = now
+        clock = now
+        heapq.heapreplace(free_at, now + service[patient])
+
+    return start, queue_length
+
+def predicted_waits(arrivals, queue_length, doctors, mean_service, day_start):
+    """
+    What /predict-wait would have told each patient on arrival
+    """
+    predicted = np.empty(arrivals.size)
+    hours = (arrivals // 60 % 24).astype(int)
+    for hour in np.unique(hours):
+        mask = hours == hour
+        predicted[mask] = predict_wait_batch(
+            queue_length[mask], mean_service / doctors, day_start + timedelta(hours=int(hour))
+        )
+    return predicted
+
+def summarize(arrivals, service, start, emergency, predicted, doctors, open_minutes):
+    """
+    utilization is consultation time over doctor time during opening hours;
+    above 1 the doctors cannot clear the day's patients before closing
+    """
+    wait = start - arrivals
+    result = {
+        "patients": int(arrivals.size),
+        "mean_wait": float(wait.mean()),
+        "max_wait": float(wait.max()),
+        "utilization": float(service.sum() / (doctors * open_minutes)),
+        "prediction_mae": float(np.abs(predicted - wait).mean()),
+    }
+    for p, value in zip(PERCENTILES, np.percentile(wait, PERCENTILES)):
+        result[f"p{p}"] = float(value)
+    if emergency.any():
+        result["emergency_p90"] = float(np.percentile(wait[emergency], 90))
+    return result
+
+def sweep(days=30, doctors=(1, 2, 3), policies=("fifo", "priority"), arrivals_per_hour=None,
+          emergency_rate=0.05, db_path=DEFAULT_DB, seed=0, utc_offset=None):
+    """
+    Simulate every (policy, doctor count) pair on the same generated traffic
+    """
+    hourly_rate, service_minutes = load_history(db_path, utc_offset)
+    if arrivals_per_hour is not None or hourly_rate is None:
+        hourly_rate = default_hourly_rate(arrivals_per_hour or 10)
+    # Hours that see arrivals count as opening hours
+    open_hours = hourly_rate > 0
+    open_minutes = days * 60 * int(np.count_nonzero(open_hours))
+
+    rng = np.random.default_rng(seed)
+    arrivals = generate_arrivals(rng, days, hourly_rate)
+    n = arrivals.size
+    service = sample_service_times(rng, n, service_minutes)
+    ages = rng.integers(1, 91, n)
+    emergency = rng.random(n) < emergency_rate
+    mean_service = float(service.mean()) if n else DEFAULT_SERVICE_MINUTES
+    day_start = datetime(2000, 1, 1)
+
+    results = []
+    for policy in policies:
+        for count in doctors:
+            started = time.perf_counter()
+            start, queue_length = simulate(arrivals, service, count, policy, ages, emergency, open_hours)
+            predicted = predicted_waits(arrivals, queue_length, count, mean_service, day_start)
+            summary = summarize(arrivals, service, start, emergency, predicted, count, open_minutes)
+            summary.update(policy=policy, doctors=count, seconds=time.perf_counter() - started)
+            results.append(summary)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default=DEFAULT_DB, help="backend SQLite database to replay")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--doctors", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--policies", nargs="+", choices=["fifo", "priority"], default=["fifo", "priority"])
+    parser.add_argument("--arrivals-per-hour", type=float, help="override the replayed arrival rate")
+    parser.add_argument("--emergency-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--utc-offset", type=float,
+                        help="clinic time zone in hours from UTC (default: this machine's local time)")
+    args = parser.parse_args()
+
+    results = sweep(args.days, args.doctors, args.policies, args.arrivals_per_hour,
+                    args.emergency_rate, args.db, args.seed, args.utc_offset)
+
+    columns = ["policy", "doctors", "patients"] + [f"p{p}" for p in PERCENTILES] + \
+              ["emergency_p90", "utilization", "prediction_mae", "seconds"]
+    print("".join(f"{c:>15}" for c in columns))
+    for row in results:
+        cells = []
+        for c in columns:
+            value = row.get(c, float("nan"))
+            cells.append(f"{value:>15.2f}" if isinstance(value, float) else f"{value:>15}")
+        print("".join(cells))
+
+if __name__ == "__main__":
+    main()
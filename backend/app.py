@@ -1,95 +1,55 @@
-from flask import Flask, request, jsonify, session
+from flask import Flask, Blueprint, request, jsonify, session, current_app, send_from_directory
+from werkzeug.exceptions import HTTPException
 from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
 import json
+import click
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your-secret-key-here-change-in-production'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///queue_system.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
-
-CORS(app, supports_credentials=True)
-db = SQLAlchemy(app)
-
-# Database Models
-class User(db.Model):
-    __tablename__ = 'users'
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    email = db.Column(db.String(100), unique=True, nullable=False)
-    password_hash = db.Column(db.String(200), nullable=False)
-    role = db.Column(db.String(20), default='user')
-    phone = db.Column(db.String(20))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
-    
-    def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
-
-class Token(db.Model):
-    __tablename__ = 'tokens'
-    id = db.Column(db.Integer, primary_key=True)
-    token_number = db.Column(db.Integer, nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    doctor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
-    status = db.Column(db.String(20), default='waiting')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    called_at = db.Column(db.DateTime, nullable=True)
-    completed_at = db.Column(db.DateTime, nullable=True)
-    
-    user = db.relationship('User', foreign_keys=[user_id])
-    doctor = db.relationship('User', foreign_keys=[doctor_id])
-
-class Suggestion(db.Model):
-    __tablename__ = 'suggestions'
-    id = db.Column(db.Integer, primary_key=True)
-    token_id = db.Column(db.Integer, db.ForeignKey('tokens.id'), nullable=False)
-    doctor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    suggestion_text = db.Column(db.Text, nullable=False)
-    medicines = db.Column(db.Text, nullable=True)
-    notes = db.Column(db.Text, nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    is_read = db.Column(db.Boolean, default=False)
-    
-    token = db.relationship('Token')
-    doctor = db.relationship('User', foreign_keys=[doctor_id])
-
-class QueueStatus(db.Model):
-    __tablename__ = 'queue_status'
-    id = db.Column(db.Integer, primary_key=True)
-    current_token = db.Column(db.Integer, default=0)
-    last_token = db.Column(db.Integer, default=0)
-    is_active = db.Column(db.Boolean, default=True)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-
-class QueueHistory(db.Model):
-    __tablename__ = 'queue_history'
-    id = db.Column(db.Integer, primary_key=True)
-    token_number = db.Column(db.Integer, nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    action = db.Column(db.String(50), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-
-class Notification(db.Model):
-    __tablename__ = 'notifications'
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    token_id = db.Column(db.Integer, db.ForeignKey('tokens.id'), nullable=True)
-    message = db.Column(db.String(500), nullable=False)
-    type = db.Column(db.String(50), nullable=False)
-    is_read = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-
-# Create tables
-with app.app_context():
+from model import db, User, Token, Suggestion, QueueStatus, QueueHistory, Notification, schema_differences
+from ratelimit import init_rate_limiter, rate_limited
+from idempotency import init_idempotency, idempotent
+from jobs import init_jobs, enqueue
+from queue_index import init_queue_index, get_waiting_index, save_waiting_index, snapshot_path
+from inbox import init_inbox, user_suggestions, unread_suggestion_count, invalidate_unread_count
+from profiling import init_profiling
+
+DEFAULT_CONFIG = {
+    'SECRET_KEY': 'your-secret-key-here-change-in-production',
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///queue_system.db',
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    'SESSION_COOKIE_SAMESITE': 'Lax',
+    # Shared Redis for rate limits, idempotency keys and unread counts; None
+    # keeps them in memory
+    'REDIS_URL': None,
+    # (requests, seconds) allowed per user and per client IP
+    'RATE_LIMITS': {
+        'token': {'user': (5, 60), 'ip': (30, 60)},
+    },
+    'IDEMPOTENCY_TTL': 600,
+    # Outbox job runner
+    'JOB_WORKERS': 4,
+    'JOB_MAX_ATTEMPTS': 5,
+    'JOB_POLL_INTERVAL': 1.0,
+    # Waiting index snapshot for warm restarts; None uses instance/queue_state.snap
+    'QUEUE_SNAPSHOT_PATH': None,
+    'UNREAD_COUNT_TTL': 60,
+    # On-demand profiling output; None uses instance/profiles
+    'PROFILE_DIR': None,
+    'PROFILE_INTERVAL': 0.005,
+}
+
+api = Blueprint('api', __name__)
+
+# Schema and seed data
+def init_db():
     db.create_all()
-    
+    # create_all skips tables that already exist, so add indexes declared since
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+def seed_defaults():
     # Create default admin if not exists
     if not User.query.filter_by(role='admin').first():
         admin = User(
@@ -143,25 +103,47 @@ def role_required(roles):
         return decorated_function
     return decorator
 
+MINUTES_PER_PATIENT = 5
+
 # Helper function to calculate estimated waiting time
 def calculate_waiting_time(current_token, target_token):
     if target_token <= current_token:
         return 0
-    return (target_token - current_token) * 5
+    return (target_token - current_token) * MINUTES_PER_PATIENT
 
-# Helper function to create notification
-def create_notification(user_id, message, notification_type, token_id=None):
-    notification = Notification(
-        user_id=user_id,
-        token_id=token_id,
-        message=message,
-        type=notification_type
+# Compare-and-set token transition: the UPDATE only matches while the token is
+# still in one of the `expected` statuses, so two concurrent requests can never
+# both move the same token. Returns True when this request won.
+def transition_token(token_id, expected, **values):
+    result = db.session.execute(
+        db.update(Token)
+        .where(Token.id == token_id, Token.status.in_(expected))
+        .values(**values)
     )
-    db.session.add(notification)
-    db.session.commit()
+    return result.rowcount == 1
+
+CALL_NEXT_ATTEMPTS = 5
+
+# Helper function to advance the current token without moving it backwards
+def advance_current_token(token_number):
+    db.session.execute(
+        db.update(QueueStatus)
+        .where(QueueStatus.current_token < token_number)
+        .values(current_token=token_number)
+    )
+
+# Helper function to create notification. The insert is queued on the outbox,
+# so call it before the view commits its own changes.
+def create_notification(user_id, message, notification_type, token_id=None):
+    enqueue('send_notifications', notifications=[{
+        'user_id': user_id,
+        'token_id': token_id,
+        'message': message,
+        'type': notification_type
+    }])
 
 # Authentication APIs
-@app.route('/api/auth/register', methods=['POST'])
+@api.route('/api/auth/register', methods=['POST'])
 def register():
     try:
         data = request.json
@@ -199,7 +181,7 @@ def register():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/auth/login', methods=['POST'])
+@api.route('/api/auth/login', methods=['POST'])
 def login():
     try:
         data = request.json
@@ -228,12 +210,12 @@ def login():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/auth/logout', methods=['POST'])
+@api.route('/api/auth/logout', methods=['POST'])
 def logout():
     session.clear()
     return jsonify({'success': True, 'message': 'Logout successful'}), 200
 
-@app.route('/api/auth/me', methods=['GET'])
+@api.route('/api/auth/me', methods=['GET'])
 @login_required
 def get_current_user():
     user = User.query.get(session['user_id'])
@@ -248,8 +230,10 @@ def get_current_user():
     }), 200
 
 # Token APIs
-@app.route('/api/token', methods=['POST'])
+@api.route('/api/token', methods=['POST'])
 @login_required
+@idempotent  # before the limiter, so replays of a stored response are not charged
+@rate_limited('token')
 def generate_token():
     try:
         user_id = session['user_id']
@@ -266,8 +250,20 @@ def generate_token():
                 'error': 'You already have a waiting token'
             }), 400
         
-        queue_status = QueueStatus.query.first()
-        new_token_number = queue_status.last_token + 1
+        # Atomic increment; it also takes the write lock, so the duplicate check
+        # below cannot race with another request from the same patient.
+        new_token_number = db.session.execute(
+            db.update(QueueStatus)
+            .values(last_token=QueueStatus.last_token + 1)
+            .returning(QueueStatus.last_token)
+        ).scalar_one()
+        
+        if Token.query.filter_by(user_id=user_id, status='waiting').count():
+            db.session.rollback()
+            return jsonify({
+                'success': False, 
+                'error': 'You already have a waiting token'
+            }), 400
         
         token = Token(
             token_number=new_token_number,
@@ -276,53 +272,52 @@ def generate_token():
         )
         db.session.add(token)
         
-        queue_status.last_token = new_token_number
-        
         history = QueueHistory(
             token_number=new_token_number,
             user_id=user_id,
             action='created'
         )
         db.session.add(history)
+        db.session.flush()
         
-        db.session.commit()
+        # Notify admins and doctors
+        enqueue(
+            'notify_role',
+            role='admin',
+            message=f'New token #{new_token_number} generated by {user.name}',
+            type='token_generated',
+            token_id=token.id
+        )
+        enqueue(
+            'notify_role',
+            role='doctor',
+            message=f'New patient in queue: Token #{new_token_number} - {user.name}',
+            type='new_patient',
+            token_id=token.id
+        )
         
-        waiting_time = calculate_waiting_time(queue_status.current_token, new_token_number)
+        db.session.commit()
         
-        # Notify admins and doctors
-        admins = User.query.filter_by(role='admin').all()
-        doctors = User.query.filter_by(role='doctor').all()
-        for admin in admins:
-            create_notification(
-                admin.id,
-                f'New token #{new_token_number} generated by {user.name}',
-                'token_generated',
-                token.id
-            )
-        for doctor in doctors:
-            create_notification(
-                doctor.id,
-                f'New patient in queue: Token #{new_token_number} - {user.name}',
-                'new_patient',
-                token.id
-            )
+        # Position counts only tokens still waiting, not cancelled or completed ones
+        position = get_waiting_index().ahead(new_token_number) + 1
         
         return jsonify({
             'success': True,
             'token': new_token_number,
-            'waiting_time': waiting_time,
-            'position': new_token_number - queue_status.current_token
+            'waiting_time': position * MINUTES_PER_PATIENT,
+            'position': position
         }), 201
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/queue/status', methods=['GET'])
+@api.route('/api/queue/status', methods=['GET'])
 def get_queue_status():
     try:
         queue_status = QueueStatus.query.first()
         
-        waiting_tokens = Token.query.filter_by(status='waiting').count()
+        waiting_tokens = len(get_waiting_index())
         with_doctor_tokens = Token.query.filter_by(status='with_doctor').count()
         
         next_tokens = Token.query.filter_by(status='waiting')\
@@ -377,7 +372,7 @@ def get_queue_status():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # Doctor APIs
-@app.route('/api/doctor/patients', methods=['GET'])
+@api.route('/api/doctor/patients', methods=['GET'])
 @login_required
 @role_required(['doctor', 'admin'])
 def get_patients_for_doctor():
@@ -434,7 +429,7 @@ def get_patients_for_doctor():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/doctor/call-patient/<int:token_id>', methods=['PUT'])
+@api.route('/api/doctor/call-patient/<int:token_id>', methods=['PUT'])
 @login_required
 @role_required(['doctor', 'admin'])
 def call_patient_to_doctor(token_id):
@@ -448,13 +443,19 @@ def call_patient_to_doctor(token_id):
                 'error': 'Patient not available'
             }), 400
         
-        token.status = 'with_doctor'
-        token.doctor_id = doctor_id
-        token.called_at = datetime.utcnow()
+        if not transition_token(
+            token_id, ['waiting'],
+            status='with_doctor',
+            doctor_id=doctor_id,
+            called_at=datetime.utcnow()
+        ):
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'error': 'Patient not available'
+            }), 400
         
-        queue_status = QueueStatus.query.first()
-        if token.token_number > queue_status.current_token:
-            queue_status.current_token = token.token_number
+        advance_current_token(token.token_number)
         
         history = QueueHistory(
             token_number=token.token_number,
@@ -463,8 +464,6 @@ def call_patient_to_doctor(token_id):
         )
         db.session.add(history)
         
-        db.session.commit()
-        
         create_notification(
             token.user_id,
             f'Token #{token.token_number} - Doctor is ready to see you. Please proceed to the consultation room.',
@@ -472,6 +471,8 @@ def call_patient_to_doctor(token_id):
             token.id
         )
         
+        db.session.commit()
+        
         return jsonify({
             'success': True,
             'message': f'Patient with token #{token.token_number} called',
@@ -480,9 +481,10 @@ def call_patient_to_doctor(token_id):
         }), 200
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/doctor/add-suggestion', methods=['POST'])
+@api.route('/api/doctor/add-suggestion', methods=['POST'])
 @login_required
 @role_required(['doctor', 'admin'])
 def add_suggestion():
@@ -510,8 +512,6 @@ def add_suggestion():
         )
         db.session.add(suggestion)
         
-        db.session.commit()
-        
         create_notification(
             token.user_id,
             f'Doctor has added suggestions for your visit. Please check your suggestions.',
@@ -519,6 +519,9 @@ def add_suggestion():
             token.id
         )
         
+        db.session.commit()
+        invalidate_unread_count(token.user_id)
+        
         return jsonify({
             'success': True,
             'message': 'Suggestion added successfully',
@@ -528,7 +531,7 @@ def add_suggestion():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/doctor/complete-patient/<int:token_id>', methods=['PUT'])
+@api.route('/api/doctor/complete-patient/<int:token_id>', methods=['PUT'])
 @login_required
 @role_required(['doctor', 'admin'])
 def complete_patient(token_id):
@@ -541,8 +544,12 @@ def complete_patient(token_id):
                 'error': 'Patient not with doctor'
             }), 400
         
-        token.status = 'completed'
-        token.completed_at = datetime.utcnow()
+        if not transition_token(token_id, ['with_doctor'], status='completed', completed_at=datetime.utcnow()):
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'error': 'Patient not with doctor'
+            }), 400
         
         history = QueueHistory(
             token_number=token.token_number,
@@ -551,8 +558,6 @@ def complete_patient(token_id):
         )
         db.session.add(history)
         
-        db.session.commit()
-        
         create_notification(
             token.user_id,
             f'Your consultation is complete. Thank you for visiting!',
@@ -560,36 +565,44 @@ def complete_patient(token_id):
             token.id
         )
         
+        db.session.commit()
+        
         return jsonify({
             'success': True,
             'message': 'Patient consultation completed'
         }), 200
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # Admin APIs
-@app.route('/api/admin/queue/next', methods=['PUT'])
+@api.route('/api/admin/queue/next', methods=['PUT'])
 @login_required
 @role_required(['admin'])
 def call_next_token_admin():
     try:
-        queue_status = QueueStatus.query.first()
-        
-        next_token = Token.query.filter_by(status='waiting')\
-            .order_by(Token.token_number)\
-            .first()
+        # A doctor may claim the head of the queue between our read and our
+        # update; when the transition loses, move on to the next waiting token.
+        next_token = None
+        for _ in range(CALL_NEXT_ATTEMPTS):
+            candidate = Token.query.filter_by(status='waiting')\
+                .order_by(Token.token_number)\
+                .first()
+            if not candidate:
+                break
+            if transition_token(candidate.id, ['waiting'], status='called', called_at=datetime.utcnow()):
+                next_token = candidate
+                break
         
         if not next_token:
+            db.session.rollback()
             return jsonify({
                 'success': False,
                 'error': 'No tokens in queue'
             }), 404
         
-        queue_status.current_token = next_token.token_number
-        
-        next_token.status = 'called'
-        next_token.called_at = datetime.utcnow()
+        db.session.execute(db.update(QueueStatus).values(current_token=next_token.token_number))
         
         history = QueueHistory(
             token_number=next_token.token_number,
@@ -598,8 +611,6 @@ def call_next_token_admin():
         )
         db.session.add(history)
         
-        db.session.commit()
-        
         create_notification(
             next_token.user_id,
             f'Token #{next_token.token_number} is now being called. Please proceed to the counter.',
@@ -607,57 +618,279 @@ def call_next_token_admin():
             next_token.id
         )
         
+        db.session.commit()
+        
         return jsonify({
             'success': True,
-            'current_token': queue_status.current_token,
+            'current_token': next_token.token_number,
             'called_token': next_token.token_number,
             'user_name': next_token.user.name
         }), 200
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/admin/queue/reset', methods=['POST'])
+@api.route('/api/admin/queue/reset', methods=['POST'])
 @login_required
 @role_required(['admin'])
 def reset_queue():
     try:
-        waiting_tokens = Token.query.filter_by(status='waiting').all()
-        for token in waiting_tokens:
-            token.status = 'cancelled'
-            token.completed_at = datetime.utcnow()
+        # Set-based compare-and-set: only tokens still waiting at UPDATE time are cancelled
+        waiting_tokens = db.session.execute(
+            db.update(Token)
+            .where(Token.status == 'waiting')
+            .values(status='cancelled', completed_at=datetime.utcnow())
+            .returning(Token.id, Token.token_number, Token.user_id)
+        ).all()
+        
+        if waiting_tokens:
+            db.session.execute(db.insert(QueueHistory), [{
+                'token_number': token.token_number,
+                'user_id': token.user_id,
+                'action': 'reset'
+            } for token in waiting_tokens])
+            enqueue('send_notifications', notifications=[{
+                'user_id': token.user_id,
+                'token_id': token.id,
+                'message': 'The queue has been reset. Please generate a new token.',
+                'type': 'queue_reset'
+            } for token in waiting_tokens])
+        
+        db.session.execute(db.update(QueueStatus).values(current_token=0, last_token=0))
+        
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'message': 'Queue reset successfully',
+            'reset_tokens': len(waiting_tokens)
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Bulk token actions: for each action, the statuses it applies to and the
+# queue_history action recorded for each of them
+BULK_TOKEN_ACTIONS = {
+    'cancel': {'waiting': 'cancelled', 'called': 'visit_cancelled', 'with_doctor': 'visit_cancelled'},
+    'reassign': {'called': 'reassigned', 'with_doctor': 'reassigned'},
+    'requeue': {'called': 'requeued', 'with_doctor': 'requeued'},
+}
+MAX_BULK_TOKENS = 500
+
+@api.route('/api/admin/tokens/bulk', methods=['POST'])
+@login_required
+@role_required(['admin'])
+def bulk_update_tokens():
+    try:
+        data = request.json or {}
+        action = data.get('action')
+        token_ids = data.get('token_ids')
+        
+        if action not in BULK_TOKEN_ACTIONS:
+            return jsonify({
+                'success': False,
+                'error': f'Unknown action, expected one of: {", ".join(BULK_TOKEN_ACTIONS)}'
+            }), 400
+        if not isinstance(token_ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in token_ids):
+            return jsonify({'success': False, 'error': 'token_ids must be a list of token ids'}), 400
+        if len(token_ids) > MAX_BULK_TOKENS:
+            return jsonify({
+                'success': False,
+                'error': f'At most {MAX_BULK_TOKENS} tokens can be updated at once'
+            }), 400
+        token_ids = list(dict.fromkeys(token_ids))
+        
+        now = datetime.utcnow()
+        if action == 'cancel':
+            values = {'status': 'cancelled', 'completed_at': now}
+            message, notification_type = 'Token #{} has been cancelled by the clinic.', 'token_cancelled'
+        elif action == 'requeue':
+            values = {'status': 'waiting', 'doctor_id': None, 'called_at': None}
+            message, notification_type = 'You have been returned to the waiting queue as token #{}.', 'token_requeued'
+        else:
+            doctor = User.query.filter_by(id=data.get('doctor_id'), role='doctor').first()
+            if not doctor:
+                return jsonify({'success': False, 'error': 'Doctor not found'}), 400
+            values = {'doctor_id': doctor.id}
+            message, notification_type = f'Token #{{}} has been reassigned to {doctor.name}.', 'token_reassigned'
+        
+        history_actions = BULK_TOKEN_ACTIONS[action]
+        tokens = {
+            t.id: t for t in db.session.query(Token.id, Token.token_number, Token.user_id, Token.status)
+            .filter(Token.id.in_(token_ids))
+        }
+        
+        errors = {}
+        by_status = {}
+        for t in tokens.values():
+            if t.status in history_actions:
+                by_status.setdefault(t.status, []).append(t.id)
+            else:
+                errors[t.id] = f'Cannot {action} a {t.status} token'
+        
+        if action == 'requeue' and any(by_status.values()):
+            # Take the write lock on the queue counter before the checks below
+            db.session.execute(db.update(QueueStatus).values(last_token=QueueStatus.last_token))
             
-            history = QueueHistory(
-                token_number=token.token_number,
-                user_id=token.user_id,
-                action='reset'
+            requeue_ids = [i for ids in by_status.values() for i in ids]
+            # A patient may only hold one waiting token, counting the ones
+            # requeued by this same request
+            busy_users = {
+                user_id for (user_id,) in db.session.query(Token.user_id)
+                .filter(Token.status == 'waiting', Token.user_id.in_({tokens[i].user_id for i in requeue_ids}))
+            }
+            for status, ids in by_status.items():
+                for i in ids:
+                    if tokens[i].user_id in busy_users:
+                        errors[i] = 'Patient already has a waiting token'
+                    else:
+                        busy_users.add(tokens[i].user_id)
+                by_status[status] = [i for i in ids if i not in errors]
+        
+        # One set-based UPDATE per previous status. The status condition makes
+        # each one a compare-and-set, so rows changed concurrently are skipped.
+        updated = []
+        for status, ids in by_status.items():
+            if not ids:
+                continue
+            result = db.session.execute(
+                db.update(Token)
+                .where(Token.id.in_(ids), Token.status == status)
+                .values(**values)
+                .returning(Token.id, Token.token_number, Token.user_id)
             )
-            db.session.add(history)
-            
-            create_notification(
-                token.user_id,
-                f'The queue has been reset. Please generate a new token.',
-                'queue_reset',
-                token.id
+            updated.extend((t, history_actions[status]) for t in result)
+        
+        if action == 'requeue' and updated:
+            # Requeued tokens go to the back of the queue under a fresh number
+            # (the old one may have been reissued since a queue reset). Only
+            # the rows actually requeued are numbered, so no number is skipped.
+            last_token = db.session.execute(
+                db.update(QueueStatus)
+                .values(last_token=QueueStatus.last_token + len(updated))
+                .returning(QueueStatus.last_token)
+            ).scalar_one()
+            history_action = {t.id: a for t, a in updated}
+            new_numbers = dict(zip(history_action, range(last_token - len(updated) + 1, last_token + 1)))
+            result = db.session.execute(
+                db.update(Token)
+                .where(Token.id.in_(new_numbers))
+                .values(token_number=db.case(new_numbers, value=Token.id))
+                .returning(Token.id, Token.token_number, Token.user_id)
             )
+            updated = [(t, history_action[t.id]) for t in result]
         
-        queue_status = QueueStatus.query.first()
-        queue_status.current_token = 0
-        queue_status.last_token = 0
+        if updated:
+            db.session.execute(db.insert(QueueHistory), [{
+                'token_number': t.token_number,
+                'user_id': t.user_id,
+                'action': history_action
+            } for t, history_action in updated])
+            enqueue('send_notifications', notifications=[{
+                'user_id': t.user_id,
+                'token_id': t.id,
+                'message': message.format(t.token_number),
+                'type': notification_type
+            } for t, _ in updated])
         
         db.session.commit()
         
+        updated_numbers = {t.id: t.token_number for t, _ in updated}
+        results = []
+        for token_id in token_ids:
+            if token_id in updated_numbers:
+                results.append({'token_id': token_id, 'success': True, 'token_number': updated_numbers[token_id]})
+            else:
+                if token_id not in tokens:
+                    error = 'Token not found'
+                else:
+                    error = errors.get(token_id, 'Token changed state, please retry')
+                results.append({'token_id': token_id, 'success': False, 'error': error})
+        
         return jsonify({
             'success': True,
-            'message': 'Queue reset successfully',
-            'reset_tokens': len(waiting_tokens)
+            'action': action,
+            'updated': len(updated),
+            'results': results
         }), 200
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# On-demand profiling admin routes (see profiling.py)
+MAX_PROFILE_REQUESTS = 1000
+
+def profiled_endpoint(data):
+    """
+    Resolve the {'path', 'method'} in data to a Flask endpoint name, or None
+    """
+    try:
+        endpoint, _ = current_app.url_map.bind('localhost').match(
+            data.get('path') or '', method=(data.get('method') or 'GET').upper()
+        )
+        return endpoint
+    except HTTPException:
+        return None
+
+@api.route('/api/admin/profiling', methods=['GET'])
+@login_required
+@role_required(['admin'])
+def get_profiling():
+    profiler = current_app.extensions['profiler']
+    return jsonify({
+        'success': True,
+        'armed': profiler.armed,
+        'profiles': profiler.profiles
+    }), 200
+
+@api.route('/api/admin/profiling', methods=['POST'])
+@login_required
+@role_required(['admin'])
+def start_profiling():
+    data = request.json or {}
+    count = data.get('requests', 50)
+    endpoint = profiled_endpoint(data)
+    
+    if endpoint is None:
+        return jsonify({'success': False, 'error': 'No route matches that path and method'}), 400
+    if not isinstance(count, int) or not 1 <= count <= MAX_PROFILE_REQUESTS:
+        return jsonify({
+            'success': False,
+            'error': f'requests must be between 1 and {MAX_PROFILE_REQUESTS}'
+        }), 400
+    
+    current_app.extensions['profiler'].arm(endpoint, count)
+    return jsonify({
+        'success': True,
+        'message': f'Profiling the next {count} requests to {endpoint}',
+        'endpoint': endpoint
+    }), 200
+
+@api.route('/api/admin/profiling', methods=['DELETE'])
+@login_required
+@role_required(['admin'])
+def stop_profiling():
+    endpoint = profiled_endpoint(request.json or {})
+    if endpoint is None:
+        return jsonify({'success': False, 'error': 'No route matches that path and method'}), 400
+    
+    return jsonify({
+        'success': True,
+        'profile': current_app.extensions['profiler'].disarm(endpoint)
+    }), 200
+
+@api.route('/api/admin/profiling/<name>', methods=['GET'])
+@login_required
+@role_required(['admin'])
+def download_profile(name):
+    return send_from_directory(current_app.extensions['profiler'].output_dir, name, as_attachment=True)
+
 # User APIs
-@app.route('/api/user/my-tokens', methods=['GET'])
+@api.route('/api/user/my-tokens', methods=['GET'])
 @login_required
 def get_my_tokens():
     try:
@@ -685,38 +918,144 @@ def get_my_tokens():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/user/my-suggestions', methods=['GET'])
+@api.route('/api/user/my-position', methods=['GET'])
+@login_required
+def get_my_position():
+    try:
+        token = Token.query.filter_by(
+            user_id=session['user_id'],
+            status='waiting'
+        ).first()
+        
+        if not token:
+            return jsonify({
+                'success': False,
+                'error': 'You do not have a waiting token'
+            }), 404
+        
+        ahead = get_waiting_index().ahead(token.token_number)
+        
+        return jsonify({
+            'success': True,
+            'token': token.token_number,
+            'ahead': ahead,
+            'position': ahead + 1,
+            'estimated_waiting_time': (ahead + 1) * MINUTES_PER_PATIENT
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+SUGGESTIONS_PAGE_SIZE = 20
+MAX_SUGGESTIONS_PAGE_SIZE = 100
+
+def suggestion_to_dict(s):
+    return {
+        'id': s.id,
+        'token_number': s.token.token_number,
+        'doctor_name': s.doctor.name,
+        'suggestion_text': s.suggestion_text,
+        'medicines': json.loads(s.medicines) if s.medicines else [],
+        'notes': s.notes,
+        'created_at': s.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'is_read': s.is_read
+    }
+
+# The inbox is paged by suggestion id, which only ever increases:
+#   ?before=<id>  the next page back, newest first; pass next_cursor as before
+#   ?since=<id>   sync mode, only suggestions newer than id, oldest first;
+#                 pass cursor back as since on the next poll
+@api.route('/api/user/my-suggestions', methods=['GET'])
 @login_required
 def get_my_suggestions():
     try:
         user_id = session['user_id']
+        limit = request.args.get('limit', SUGGESTIONS_PAGE_SIZE, type=int)
+        since = request.args.get('since', type=int)
+        before = request.args.get('before', type=int)
         
-        suggestions = Suggestion.query\
-            .join(Token, Token.id == Suggestion.token_id)\
-            .filter(Token.user_id == user_id)\
-            .order_by(Suggestion.created_at.desc())\
-            .all()
+        if limit < 1 or limit > MAX_SUGGESTIONS_PAGE_SIZE:
+            return jsonify({
+                'success': False,
+                'error': f'limit must be between 1 and {MAX_SUGGESTIONS_PAGE_SIZE}'
+            }), 400
+        
+        query = user_suggestions(user_id)
+        if since is not None:
+            query = query.filter(Suggestion.id > since).order_by(Suggestion.id)
+        else:
+            if before is not None:
+                query = query.filter(Suggestion.id < before)
+            query = query.order_by(Suggestion.id.desc())
+        
+        # One extra row tells us whether there is another page
+        suggestions = query.limit(limit + 1).all()
+        has_more = len(suggestions) > limit
+        suggestions = suggestions[:limit]
+        
+        response = {
+            'success': True,
+            'suggestions': [suggestion_to_dict(s) for s in suggestions],
+            'has_more': has_more,
+            'unread_count': unread_suggestion_count(user_id)
+        }
+        if since is not None:
+            response['cursor'] = suggestions[-1].id if suggestions else since
+        else:
+            response['next_cursor'] = suggestions[-1].id if has_more else None
+        
+        return jsonify(response), 200
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api.route('/api/user/suggestions/unread-count', methods=['GET'])
+@login_required
+def get_unread_suggestion_count():
+    try:
+        return jsonify({
+            'success': True,
+            'unread_count': unread_suggestion_count(session['user_id'])
+        }), 200
         
-        suggestion_list = [{
-            'id': s.id,
-            'token_number': s.token.token_number,
-            'doctor_name': s.doctor.name,
-            'suggestion_text': s.suggestion_text,
-            'medicines': json.loads(s.medicines) if s.medicines else [],
-            'notes': s.notes,
-            'created_at': s.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            'is_read': s.is_read
-        } for s in suggestions]
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api.route('/api/user/suggestions/mark-read', methods=['PUT'])
+@login_required
+def mark_suggestions_read():
+    try:
+        user_id = session['user_id']
+        data = request.get_json(silent=True) or {}
+        suggestion_ids = data.get('suggestion_ids')
+        
+        if suggestion_ids is not None and (
+            not isinstance(suggestion_ids, list) or not all(isinstance(i, int) for i in suggestion_ids)
+        ):
+            return jsonify({'success': False, 'error': 'suggestion_ids must be a list of suggestion ids'}), 400
+        
+        # Without suggestion_ids every unread suggestion is marked read
+        query = db.update(Suggestion).where(
+            Suggestion.is_read.is_(False),
+            Suggestion.token_id.in_(db.select(Token.id).where(Token.user_id == user_id))
+        )
+        if suggestion_ids is not None:
+            query = query.where(Suggestion.id.in_(suggestion_ids))
+        result = db.session.execute(query.values(is_read=True))
+        db.session.commit()
+        invalidate_unread_count(user_id)
         
         return jsonify({
             'success': True,
-            'suggestions': suggestion_list
+            'marked': result.rowcount,
+            'unread_count': unread_suggestion_count(user_id)
         }), 200
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/user/notifications', methods=['GET'])
+@api.route('/api/user/notifications', methods=['GET'])
 @login_required
 def get_notifications():
     try:
@@ -742,7 +1081,7 @@ def get_notifications():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/user/notifications/mark-read/<int:notification_id>', methods=['PUT'])
+@api.route('/api/user/notifications/mark-read/<int:notification_id>', methods=['PUT'])
 @login_required
 def mark_notification_read(notification_id):
     try:
@@ -756,5 +1095,65 @@ def mark_notification_read(notification_id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Application factory
+def create_app(test_config=None):
+    app = Flask(__name__)
+    app.config.from_mapping(DEFAULT_CONFIG)
+    if test_config:
+        app.config.from_mapping(test_config)
+    
+    CORS(app, supports_credentials=True)
+    db.init_app(app)
+    init_rate_limiter(app)
+    init_idempotency(app)
+    init_jobs(app)
+    init_queue_index(app)
+    init_inbox(app)
+    init_profiling(app)
+    app.register_blueprint(api)
+    
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create all database tables."""
+        init_db()
+        click.echo('Database tables created')
+    
+    @app.cli.command('seed')
+    def seed_command():
+        """Create the default admin, doctor and queue status rows."""
+        init_db()
+        seed_defaults()
+    
+    @app.cli.command('check-schema')
+    def check_schema_command():
+        """Compare the models with the configured database schema."""
+        differences = schema_differences(db.engine)
+        for difference in differences:
+            click.echo(difference)
+        if differences:
+            raise SystemExit(1)
+        click.echo('Schema matches the models')
+    
+    @app.cli.command('snapshot-queue')
+    def snapshot_queue_command():
+        """Write the waiting index snapshot used for warm restarts."""
+        get_waiting_index()
+        save_waiting_index(app)
+        click.echo(f'Snapshot written to {snapshot_path(app)}')
+    
+    @app.cli.command('drain-jobs')
+    def drain_jobs_command():
+        """Run every due outbox job in the foreground."""
+        count = app.extensions['job_runner'].drain()
+        click.echo(f'Ran {count} job(s)')
+    
+    return app
+
 if __name__ == '__main__':
+    app = create_app()
+    # The development server keeps the old convenience of preparing the
+    # database on start; production workers run `flask --app app seed` once.
+    with app.app_context():
+        init_db()
+        seed_defaults()
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,83 @@
+"""
+Measure how quickly a fresh backend worker becomes ready to serve.
+
+Each run spawns a new interpreter (like a gunicorn worker fork/exec) and
+records the time to import app.py, build the app with create_app() and
+answer a first request. Run from the backend directory:
+
+    python benchmarks/startup.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER_SCRIPT = '''
+import json, sys, time
+t0 = time.perf_counter()
+import app as backend
+t1 = time.perf_counter()
+application = backend.create_app({'SQLALCHEMY_DATABASE_URI': sys.argv[1], 'QUEUE_SNAPSHOT_PATH': sys.argv[2]})
+t2 = time.perf_counter()
+response = application.test_client().get('/api/queue/status')
+t3 = time.perf_counter()
+print(json.dumps({
+    'import': t1 - t0,
+    'create_app': t2 - t1,
+    'first_request': t3 - t2,
+    'ready': t3 - t0,
+    'status': response.status_code,
+}))
+'''
+
+
+def prepare_database(uri, snapshot):
+    # Seeding happens once, outside the measured runs, as it would in a deploy.
+    subprocess.run(
+        [sys.executable, '-c',
+         'import sys, app\n'
+         'a = app.create_app({"SQLALCHEMY_DATABASE_URI": sys.argv[1], "QUEUE_SNAPSHOT_PATH": sys.argv[2]})\n'
+         'with a.app_context():\n'
+         '    app.init_db()\n'
+         '    app.seed_defaults()\n',
+         uri, snapshot],
+        cwd=BACKEND_DIR, check=True, stdout=subprocess.DEVNULL
+    )
+
+
+def run_worker(uri, snapshot):
+    output = subprocess.run(
+        [sys.executable, '-c', WORKER_SCRIPT, uri, snapshot],
+        cwd=BACKEND_DIR, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        uri = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+        # Keep the throwaway database's snapshot out of instance/
+        snapshot = os.path.join(tmp, 'queue_state.snap')
+        prepare_database(uri, snapshot)
+        results = [run_worker(uri, snapshot) for _ in range(args.runs)]
+
+    print(f'{"phase":<15}{"median ms":>12}{"max ms":>12}')
+    for phase in ('import', 'create_app', 'first_request', 'ready'):
+        values = [r[phase] * 1000 for r in results]
+        print(f'{phase:<15}{statistics.median(values):>12.1f}{max(values):>12.1f}')
+    failures = [r for r in results if r['status'] != 200]
+    if failures:
+        print(f'{len(failures)} run(s) did not return 200')
+
+
+if __name__ == '__main__':
+    main()
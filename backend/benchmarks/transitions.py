@@ -0,0 +1,184 @@
+"""
+Hammer the token state machine from many threads or processes, then check
+that no token was double-transitioned and report throughput.
+
+Every worker races every other worker over the same patients and tokens:
+
+    generate   all workers POST /api/token for every patient (double taps)
+    transition all workers try call-patient and complete-patient on every
+               token, while some also call PUT /api/admin/queue/next
+
+Run from the backend directory:
+
+    python benchmarks/transitions.py --mode threads --workers 8
+    python benchmarks/transitions.py --mode processes --workers 4
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as backend
+from model import db, User, Token, QueueHistory
+
+_apps = {}
+
+def get_app(db_uri):
+    # One app per process: threads share it like threads of one server worker
+    if db_uri not in _apps:
+        _apps[db_uri] = backend.create_app({
+            'SQLALCHEMY_DATABASE_URI': db_uri,
+            'RATE_LIMITS': {},
+            'QUEUE_SNAPSHOT_PATH': os.path.join(os.path.dirname(db_uri[len('sqlite:///'):]), 'queue.snap'),
+        })
+    return _apps[db_uri]
+
+def client_for(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+    return client
+
+def generate_worker(db_uri, patient_ids, seed):
+    app = get_app(db_uri)
+    order = list(patient_ids)
+    random.Random(seed).shuffle(order)
+    statuses = Counter()
+    for patient_id in order:
+        statuses[client_for(app, patient_id).post('/api/token').status_code] += 1
+    return statuses, []
+
+def transition_worker(db_uri, doctor_id, admin_id, token_ids, seed, call_next):
+    app = get_app(db_uri)
+    rng = random.Random(seed)
+    doctor = client_for(app, doctor_id)
+    admin = client_for(app, admin_id)
+    order = list(token_ids)
+    rng.shuffle(order)
+
+    statuses = Counter()
+    wins = []
+    for token_id in order:
+        if call_next and rng.random() < 0.2:
+            response = admin.put('/api/admin/queue/next')
+            statuses[response.status_code] += 1
+            if response.status_code == 200:
+                wins.append(('called', response.json['called_token']))
+        response = doctor.put(f'/api/doctor/call-patient/{token_id}')
+        statuses[response.status_code] += 1
+        if response.status_code == 200:
+            wins.append(('called_to_doctor', response.json['token']))
+        response = doctor.put(f'/api/doctor/complete-patient/{token_id}')
+        statuses[response.status_code] += 1
+        if response.status_code == 200:
+            wins.append(('completed', token_id))
+    return statuses, wins
+
+def run_phase(executor, workers, func, args_for):
+    started = time.perf_counter()
+    futures = [executor.submit(func, *args_for(i)) for i in range(workers)]
+    statuses, wins = Counter(), []
+    for future in futures:
+        worker_statuses, worker_wins = future.result()
+        statuses.update(worker_statuses)
+        wins.extend(worker_wins)
+    return statuses, wins, time.perf_counter() - started
+
+def check_invariants(app, patient_ids, generate_statuses, wins):
+    problems = []
+    with app.app_context():
+        tokens = Token.query.all()
+        history = Counter((h.token_number, h.action) for h in QueueHistory.query.all())
+
+    per_patient = Counter(t.user_id for t in tokens)
+    duplicates = [p for p in patient_ids if per_patient[p] != 1]
+    if duplicates:
+        problems.append(f'{len(duplicates)} patient(s) do not hold exactly one token')
+    numbers = Counter(t.token_number for t in tokens)
+    if any(count > 1 for count in numbers.values()):
+        problems.append('duplicate token numbers were issued')
+    if generate_statuses[201] != len(tokens):
+        problems.append(f'{generate_statuses[201]} token responses for {len(tokens)} tokens')
+
+    by_number = {t.token_number: t for t in tokens}
+    left_waiting = Counter(number for action, number in wins if action in ('called', 'called_to_doctor'))
+    completed = Counter(token_id for action, token_id in wins if action == 'completed')
+    for number, count in left_waiting.items():
+        if count > 1:
+            problems.append(f'token #{number} left the waiting list {count} times')
+    for token_id, count in completed.items():
+        if count > 1:
+            problems.append(f'token id {token_id} was completed {count} times')
+
+    for number, token in by_number.items():
+        calls = history[(number, 'called')] + history[(number, 'called_to_doctor')]
+        if calls != left_waiting[number]:
+            problems.append(f'token #{number}: {calls} call history rows, {left_waiting[number]} successful calls')
+        expected_status = {
+            (0, 0): 'waiting',
+            (1, 0): 'called' if history[(number, 'called')] else 'with_doctor',
+            (1, 1): 'completed',
+        }.get((calls, history[(number, 'completed')]))
+        if token.status != expected_status:
+            problems.append(f'token #{number} is {token.status}, history says {expected_status}')
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mode', choices=['threads', 'processes'], default='threads')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--patients', type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_uri = 'sqlite:///' + os.path.join(tmp, 'transitions.db')
+        app = get_app(db_uri)
+        with app.app_context():
+            backend.init_db()
+            backend.seed_defaults()
+            patients = [User(name=f'Patient {i}', email=f'patient{i}@bench', password_hash='-') for i in range(args.patients)]
+            db.session.add_all(patients)
+            db.session.commit()
+            patient_ids = [p.id for p in patients]
+            doctor_id = User.query.filter_by(role='doctor').first().id
+            admin_id = User.query.filter_by(role='admin').first().id
+
+        pool_class = ThreadPoolExecutor if args.mode == 'threads' else ProcessPoolExecutor
+        with pool_class(args.workers) as executor:
+            generate_statuses, _, generate_time = run_phase(
+                executor, args.workers, generate_worker,
+                lambda i: (db_uri, patient_ids, i)
+            )
+            with app.app_context():
+                token_ids = [t.id for t in Token.query.all()]
+            transition_statuses, wins, transition_time = run_phase(
+                executor, args.workers, transition_worker,
+                lambda i: (db_uri, doctor_id, admin_id, token_ids, 1000 + i, i % 2 == 0)
+            )
+
+        app.extensions['job_runner'].shutdown()
+        problems = check_invariants(app, patient_ids, generate_statuses, wins)
+
+    print(f'mode={args.mode} workers={args.workers} patients={args.patients}')
+    for name, statuses, elapsed, successes in (
+        ('generate', generate_statuses, generate_time, generate_statuses[201]),
+        ('transition', transition_statuses, transition_time, len(wins)),
+    ):
+        total = sum(statuses.values())
+        print(f'{name:<11}{total:>7} requests {total / elapsed:>9.1f} req/s '
+              f'{successes / elapsed:>9.1f} transitions/s  status codes {dict(sorted(statuses.items()))}')
+    if problems:
+        print(f'{len(problems)} invariant violation(s):')
+        for problem in problems[:20]:
+            print(f'  {problem}')
+        sys.exit(1)
+    print('all invariants hold')
+
+if __name__ == '__main__':
+    main()
@@ -1,38 +0,0 @@
-from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
-
-db = SQLAlchemy()
-
-class User(db.Model):
-    __tablename__ = 'users'
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    email = db.Column(db.String(100), unique=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    tokens = db.relationship('Token', backref='user', lazy=True)
-
-class Token(db.Model):
-    __tablename__ = 'tokens'
-    id = db.Column(db.Integer, primary_key=True)
-    token_number = db.Column(db.Integer, nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    status = db.Column(db.String(20), default='waiting')  # waiting, completed, cancelled
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    called_at = db.Column(db.DateTime, nullable=True)
-    completed_at = db.Column(db.DateTime, nullable=True)
-
-class QueueStatus(db.Model):
-    __tablename__ = 'queue_status'
-    id = db.Column(db.Integer, primary_key=True)
-    current_token = db.Column(db.Integer, default=0)
-    last_token = db.Column(db.Integer, default=0)
-    is_active = db.Column(db.Boolean, default=True)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-
-class QueueHistory(db.Model):
-    __tablename__ = 'queue_history'
-    id = db.Column(db.Integer, primary_key=True)
-    token_number = db.Column(db.Integer, nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    action = db.Column(db.String(50), nullable=False)  # created, called, completed, reset
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
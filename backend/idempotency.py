@@ -0,0 +1,122 @@
+from flask import current_app, request, session, jsonify
+from collections import OrderedDict
+from functools import wraps
+import json
+import threading
+import time
+
+from redis_client import redis_client
+
+# Idempotency keys let a client retry a POST safely: the first request with a
+# given Idempotency-Key runs the view and its response is stored, retries with
+# the same key get the stored response back without touching the database.
+
+PENDING = 'pending'
+DONE = 'done'
+
+class MemoryStore:
+    def __init__(self, ttl, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, key):
+        """
+        Claim the key. Returns (None, None) when the caller should run the
+        view, otherwise (PENDING, None) or (DONE, (body, status))
+        """
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                _, state, result = entry
+                return state, result
+            self._entries[key] = (now + self.ttl, PENDING, None)
+            return None, None
+
+    def finish(self, key, body, status):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, DONE, (body, status))
+
+    def abort(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _expire(self, now):
+        # Entries are kept in claim order, so expired ones sit at the front.
+        while self._entries:
+            key, (expires, _, _) = next(iter(self._entries.items()))
+            if expires > now and len(self._entries) < self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+class RedisStore:
+    def __init__(self, url, ttl):
+        self.ttl = ttl
+        self._redis = redis_client(url)
+
+    def begin(self, key):
+        key = f'idempotency:{key}'
+        entry = None
+        while entry is None:
+            if self._redis.set(key, json.dumps({'state': PENDING}), nx=True, ex=self.ttl):
+                return None, None
+            # The key may expire between SET NX and GET; claim it again if so.
+            entry = self._redis.get(key)
+        entry = json.loads(entry)
+        if entry['state'] == DONE:
+            return DONE, (entry['body'].encode('utf-8'), entry['status'])
+        return PENDING, None
+
+    def finish(self, key, body, status):
+        entry = {'state': DONE, 'body': body.decode('utf-8'), 'status': status}
+        self._redis.set(f'idempotency:{key}', json.dumps(entry), ex=self.ttl)
+
+    def abort(self, key):
+        self._redis.delete(f'idempotency:{key}')
+
+def init_idempotency(app):
+    url = app.config.get('REDIS_URL')
+    ttl = app.config['IDEMPOTENCY_TTL']
+    app.extensions['idempotency'] = RedisStore(url, ttl) if url else MemoryStore(ttl)
+
+def idempotent(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if not idempotency_key:
+            return f(*args, **kwargs)
+        if len(idempotency_key) > 255:
+            return jsonify({'success': False, 'error': 'Idempotency-Key is too long'}), 400
+
+        store = current_app.extensions['idempotency']
+        key = f'{request.endpoint}:{session.get("user_id")}:{idempotency_key}'
+        state, result = store.begin(key)
+
+        if state == DONE:
+            body, status = result
+            response = current_app.response_class(body, status=status, mimetype='application/json')
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+        if state == PENDING:
+            return jsonify({
+                'success': False,
+                'error': 'A request with this Idempotency-Key is still in progress'
+            }), 409
+
+        try:
+            response = current_app.make_response(f(*args, **kwargs))
+        except Exception:
+            store.abort(key)
+            raise
+
+        # Server errors and rate-limit rejections are not stored, so that the
+        # retry gets a real second attempt.
+        if response.status_code < 500 and response.status_code != 429:
+            store.finish(key, response.get_data(), response.status_code)
+        else:
+            store.abort(key)
+        return response
+    return decorated_function
@@ -0,0 +1,113 @@
+from flask import current_app
+from sqlalchemy.orm import contains_eager
+import threading
+import time
+
+from model import db, Token, Suggestion
+from redis_client import redis_client
+
+# Cached per-user count of unread suggestions. The dashboard asks for it on
+# every poll, so it is served from memory (or Redis, shared by all workers)
+# and only recounted after a write invalidates it or the entry expires.
+#
+# Every invalidation bumps a per-user version. A reader notes the version
+# before counting and its result is only cached if the version is unchanged,
+# so a count taken before a concurrent write commits is never cached after
+# that write's invalidation. Views invalidate *after* their commit.
+
+class MemoryCounts:
+    def __init__(self, ttl, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        # Kept apart from the entries so that evicting a count never resets
+        # a version; one int per user who ever had a write
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """
+        (cached count or None, version to pass back to set)
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            version = self._versions.get(user_id, 0)
+        if entry is None or entry[0] <= time.time():
+            return None, version
+        return entry[1], version
+
+    def set(self, user_id, count, version):
+        with self._lock:
+            if self._versions.get(user_id, 0) != version:
+                return
+            if len(self._entries) >= self.max_entries:
+                now = time.time()
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[user_id] = (time.time() + self.ttl, count)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+class RedisCounts:
+    # Store the count only if the version key still holds the reader's version
+    SCRIPT = '''
+if (redis.call('GET', KEYS[2]) or '0') == ARGV[2] then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+end
+'''
+    VERSION_TTL = 86400
+
+    def __init__(self, url, ttl):
+        self.ttl = ttl
+        self._redis = redis_client(url)
+        self._script = self._redis.register_script(self.SCRIPT)
+
+    def get(self, user_id):
+        count, version = self._redis.mget(f'unread_suggestions:{user_id}', f'unread_suggestions:{user_id}:version')
+        return (int(count) if count is not None else None), (version or b'0').decode()
+
+    def set(self, user_id, count, version):
+        self._script(
+            keys=[f'unread_suggestions:{user_id}', f'unread_suggestions:{user_id}:version'],
+            args=[count, version, self.ttl]
+        )
+
+    def invalidate(self, user_id):
+        pipe = self._redis.pipeline()
+        pipe.incr(f'unread_suggestions:{user_id}:version')
+        pipe.expire(f'unread_suggestions:{user_id}:version', self.VERSION_TTL)
+        pipe.delete(f'unread_suggestions:{user_id}')
+        pipe.execute()
+
+def init_inbox(app):
+    url = app.config.get('REDIS_URL')
+    ttl = app.config['UNREAD_COUNT_TTL']
+    app.extensions['unread_counts'] = RedisCounts(url, ttl) if url else MemoryCounts(ttl)
+
+def user_suggestions(user_id):
+    """
+    Query for the user's suggestions, with token and doctor loaded in the
+    same SELECT; the token's own relationships are not needed here
+    """
+    return Suggestion.query\
+        .join(Suggestion.token)\
+        .options(contains_eager(Suggestion.token).lazyload('*'))\
+        .filter(Token.user_id == user_id)
+
+def unread_suggestion_count(user_id):
+    counts = current_app.extensions['unread_counts']
+    count, version = counts.get(user_id)
+    if count is None:
+        count = db.session.query(db.func.count(Suggestion.id))\
+            .join(Token, Token.id == Suggestion.token_id)\
+            .filter(Token.user_id == user_id, Suggestion.is_read.is_(False))\
+            .scalar()
+        counts.set(user_id, count, version)
+    return count
+
+def invalidate_unread_count(user_id):
+    current_app.extensions['unread_counts'].invalidate(user_id)
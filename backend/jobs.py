@@ -0,0 +1,193 @@
+from flask import current_app
+from sqlalchemy import event
+from datetime import datetime, timedelta
+import atexit
+import json
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from model import db, OutboxJob, User, Notification
+
+# Transactional outbox for slow side effects. Views call enqueue() before
+# their commit, so the job row lands in the same transaction as the state
+# change it belongs to. After the commit a JobRunner thread claims the rows
+# and runs the registered handler on a bounded thread pool, retrying failures
+# with exponential backoff.
+
+_handlers = {}
+
+def job(kind):
+    def decorator(f):
+        _handlers[kind] = f
+        return f
+    return decorator
+
+def enqueue(kind, **payload):
+    if kind not in _handlers:
+        raise ValueError(f'Unknown job kind: {kind}')
+    db.session.add(OutboxJob(kind=kind, payload=json.dumps(payload)))
+    db.session.info['outbox_pending'] = True
+
+class JobRunner:
+    def __init__(self, app, max_workers=4, max_attempts=5, poll_interval=1.0, lease_seconds=300):
+        self.app = app
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.lease = timedelta(seconds=lease_seconds)
+        self._wakeup = threading.Event()
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._dispatcher = None
+        self._executor = None
+
+    @property
+    def started(self):
+        return self._dispatcher is not None or self._stopping
+
+    def wake(self):
+        # Threads are only started once there is work or a request to serve,
+        # so CLI commands and scripts that never enqueue do not spawn any.
+        with self._lock:
+            if self._stopping:
+                return
+            if self._dispatcher is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='outbox')
+                self._dispatcher = threading.Thread(target=self._dispatch_loop, name='outbox-dispatcher', daemon=True)
+                self._dispatcher.start()
+                atexit.register(self.shutdown)
+        self._wakeup.set()
+
+    def shutdown(self, timeout=30):
+        """
+        Stop taking new wakeups and run every job that is due before returning
+        """
+        with self._lock:
+            if self._stopping:
+                return
+            self._stopping = True
+        self._wakeup.set()
+        if self._dispatcher is not None:
+            self._dispatcher.join(timeout)
+            self._executor.shutdown(wait=True)
+        self.drain()
+
+    def drain(self):
+        """
+        Run all due jobs in the calling thread; returns how many were run
+        """
+        count = 0
+        while True:
+            claimed = self._claim(self.max_workers)
+            if not claimed:
+                return count
+            for job_id in claimed:
+                self._run(job_id)
+                count += 1
+
+    def _dispatch_loop(self):
+        while not self._stopping:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            while not self._stopping:
+                free = 0
+                while self._slots.acquire(blocking=False):
+                    free += 1
+                claimed = self._claim(free) if free else []
+                for _ in range(free - len(claimed)):
+                    self._slots.release()
+                for job_id in claimed:
+                    self._executor.submit(self._run_in_slot, job_id)
+                if len(claimed) < free or not free:
+                    break
+
+    def _claim(self, limit):
+        with self.app.app_context():
+            now = datetime.utcnow()
+            candidates = db.session.query(OutboxJob.id)\
+                .filter(OutboxJob.status.in_(['pending', 'running']), OutboxJob.available_at <= now)\
+                .order_by(OutboxJob.id)\
+                .limit(limit)\
+                .all()
+
+            claimed = []
+            for (job_id,) in candidates:
+                # Compare-and-set so concurrent runners never claim the same row;
+                # a 'running' row is only reclaimed once its lease has expired.
+                result = db.session.execute(
+                    db.update(OutboxJob)
+                    .where(OutboxJob.id == job_id,
+                           OutboxJob.status.in_(['pending', 'running']),
+                           OutboxJob.available_at <= now)
+                    .values(status='running',
+                            attempts=OutboxJob.attempts + 1,
+                            available_at=now + self.lease)
+                )
+                if result.rowcount == 1:
+                    claimed.append(job_id)
+            db.session.commit()
+            return claimed
+
+    def _run_in_slot(self, job_id):
+        try:
+            self._run(job_id)
+        finally:
+            self._slots.release()
+            self._wakeup.set()
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            outbox_job = db.session.get(OutboxJob, job_id)
+            if outbox_job is None:
+                return
+            try:
+                _handlers[outbox_job.kind](**json.loads(outbox_job.payload))
+                db.session.delete(outbox_job)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                outbox_job = db.session.get(OutboxJob, job_id)
+                outbox_job.last_error = traceback.format_exc(limit=5)
+                if outbox_job.attempts >= self.max_attempts:
+                    outbox_job.status = 'failed'
+                else:
+                    outbox_job.status = 'pending'
+                    outbox_job.available_at = datetime.utcnow() + timedelta(seconds=2 ** outbox_job.attempts)
+                db.session.commit()
+
+def _wake_runner_after_commit(session):
+    if session.info.pop('outbox_pending', False):
+        current_app.extensions['job_runner'].wake()
+
+def init_jobs(app):
+    runner = JobRunner(
+        app,
+        max_workers=app.config['JOB_WORKERS'],
+        max_attempts=app.config['JOB_MAX_ATTEMPTS'],
+        poll_interval=app.config['JOB_POLL_INTERVAL'],
+    )
+    app.extensions['job_runner'] = runner
+    if not event.contains(db.session, 'after_commit', _wake_runner_after_commit):
+        event.listen(db.session, 'after_commit', _wake_runner_after_commit)
+
+    @app.before_request
+    def start_job_runner():
+        # Pending and lease-expired jobs left by a previous process are picked
+        # up as soon as this one serves traffic, not at its first enqueue.
+        if not runner.started:
+            runner.wake()
+
+# Job handlers
+@job('send_notifications')
+def send_notifications(notifications):
+    db.session.add_all([Notification(**n) for n in notifications])
+
+@job('notify_role')
+def notify_role(role, message, type, token_id=None):
+    user_ids = db.session.query(User.id).filter_by(role=role).all()
+    db.session.add_all([
+        Notification(user_id=user_id, token_id=token_id, message=message, type=type)
+        for (user_id,) in user_ids
+    ])
@@ -1,7 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 
+# Single SQLAlchemy instance shared by every backend module. It is bound to an
+# app in create_app(), so importing the models never opens a connection.
 db = SQLAlchemy()
 
 class User(db.Model):
@@ -13,12 +16,10 @@ class User(db.Model):
     role = db.Column(db.String(20), default='user')  # 'user', 'admin', 'doctor'
     phone = db.Column(db.String(20))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    tokens = db.relationship('Token', backref='user', lazy=True)
-    suggestions = db.relationship('Suggestion', backref='doctor', lazy=True)
-    
+
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
-    
+
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
@@ -26,18 +27,22 @@ class Token(db.Model):
     __tablename__ = 'tokens'
     id = db.Column(db.Integer, primary_key=True)
     token_number = db.Column(db.Integer, nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     doctor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
-    status = db.Column(db.String(20), default='waiting')  # waiting, with_doctor, completed, cancelled
+    status = db.Column(db.String(20), default='waiting')  # waiting, called, with_doctor, completed, cancelled
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     called_at = db.Column(db.DateTime, nullable=True)
     completed_at = db.Column(db.DateTime, nullable=True)
-    suggestions = db.relationship('Suggestion', backref='token', lazy=True)
+
+    # Every token listing prints the patient name, so load it in the same query.
+    user = db.relationship('User', foreign_keys=[user_id], lazy='joined', innerjoin=True)
+    # Most tokens share a handful of doctors; selectin fetches each one once per listing.
+    doctor = db.relationship('User', foreign_keys=[doctor_id], lazy='selectin')
 
 class Suggestion(db.Model):
     __tablename__ = 'suggestions'
     id = db.Column(db.Integer, primary_key=True)
-    token_id = db.Column(db.Integer, db.ForeignKey('tokens.id'), nullable=False)
+    token_id = db.Column(db.Integer, db.ForeignKey('tokens.id'), nullable=False, index=True)
     doctor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     suggestion_text = db.Column(db.Text, nullable=False)
     medicines = db.Column(db.Text, nullable=True)  # JSON string of medicines
@@ -45,6 +50,9 @@ class Suggestion(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_read = db.Column(db.Boolean, default=False)  # Whether user has seen the suggestion
 
+    token = db.relationship('Token', lazy='joined', innerjoin=True)
+    doctor = db.relationship('User', foreign_keys=[doctor_id], lazy='joined', innerjoin=True)
+
 class QueueStatus(db.Model):
     __tablename__ = 'queue_status'
     id = db.Column(db.Integer, primary_key=True)
@@ -58,7 +66,7 @@ class QueueHistory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     token_number = db.Column(db.Integer, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    action = db.Column(db.String(50), nullable=False)  # created, called, completed, reset
+    action = db.Column(db.String(50), nullable=False)  # created, called, called_to_doctor, completed, reset, cancelled, visit_cancelled, reassigned, requeued
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Notification(db.Model):
@@ -69,4 +77,54 @@ class Notification(db.Model):
     message = db.Column(db.String(500), nullable=False)
     type = db.Column(db.String(50), nullable=False)  # token_called, suggestion_added, queue_update
     is_read = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class OutboxJob(db.Model):
+    __tablename__ = 'outbox_jobs'
+    __table_args__ = (db.Index('ix_outbox_jobs_status_available_at', 'status', 'available_at'),)
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON encoded handler arguments
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # next attempt, or lease expiry while running
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+def schema_differences(engine):
+    """
+    Compare the model tables with the live database schema and return a list
+    of human readable differences (empty when they match)
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    differences = []
+
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            differences.append(f'missing table {table.name}')
+            continue
+
+        existing = {c['name']: c for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            found = existing.pop(column.name, None)
+            if found is None:
+                differences.append(f'{table.name}.{column.name}: missing column')
+                continue
+
+            expected_type = column.type.compile(dialect=engine.dialect)
+            found_type = found['type'].compile(dialect=engine.dialect)
+            if expected_type != found_type:
+                differences.append(f'{table.name}.{column.name}: type {found_type}, expected {expected_type}')
+            if not column.primary_key and column.nullable != found['nullable']:
+                differences.append(f'{table.name}.{column.name}: nullable {found["nullable"]}, expected {column.nullable}')
+
+        for name in existing:
+            differences.append(f'{table.name}.{name}: column not in models')
+
+        existing_indexes = {i['name'] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                differences.append(f'{table.name}: missing index {index.name}')
+
+    return differences
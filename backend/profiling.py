@@ -0,0 +1,28 @@
+from flask import g, request
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'shared'))
+
+from sampler import RouteProfiler
+
+# The thread serving a profiled request is sampled. State is per process, so
+# with several server workers only the worker that received the switch is armed.
+
+def init_profiling(app):
+    profiler = RouteProfiler(
+        app.config.get('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles'),
+        app.config['PROFILE_INTERVAL'],
+    )
+    app.extensions['profiler'] = profiler
+
+    @app.before_request
+    def begin_profiled_request():
+        if profiler.armed and profiler.begin(request.endpoint):
+            g.profiled_endpoint = request.endpoint
+
+    @app.teardown_request
+    def end_profiled_request(exc):
+        endpoint = g.pop('profiled_endpoint', None)
+        if endpoint is not None:
+            profiler.end(endpoint)
@@ -0,0 +1,233 @@
+from flask import current_app
+import atexit
+import hashlib
+import os
+import threading
+import time
+
+from model import db, Token, QueueHistory
+from snapshot import save_snapshot, load_snapshot
+
+# In-memory index of waiting token numbers. A Fenwick tree over token numbers
+# answers "how many waiting tokens are ahead of #n" in O(log n), so position
+# and ETA queries never scan the waiting list.
+#
+# The index is derived from the queue_history log: every read first applies
+# the rows added since `last_history_id`, which keeps each worker in step
+# with changes committed by the others. On first use it starts from the
+# snapshot file when there is one, otherwise from the tokens table.
+#
+# History ids do not always commit in id order: on Postgres a transaction
+# holding a lower id can commit after one holding a higher id. Ids skipped
+# below `last_history_id` are kept as gaps and re-read on every sync until
+# they show up, or until GAP_TIMEOUT passes (the transaction rolled back).
+# Applying them late is safe because actions on the same token number are
+# causally ordered, so a late row never overtakes a newer one for its token.
+
+# queue_history actions that put a token into, or take it out of, the waiting list
+ADD_ACTIONS = {'created', 'requeued'}
+REMOVE_ACTIONS = {'called', 'called_to_doctor', 'reset', 'cancelled'}
+
+GAP_TIMEOUT = 60.0
+MAX_GAPS = 1000
+
+class FenwickTree:
+    def __init__(self, size):
+        self.size = size
+        self._tree = [0] * (size + 1)
+
+    @classmethod
+    def from_counts(cls, counts):
+        # counts[i] is the value at position i + 1; builds in O(n).
+        tree = cls(len(counts))
+        tree._tree[1:] = counts
+        for i in range(1, tree.size + 1):
+            parent = i + (i & -i)
+            if parent <= tree.size:
+                tree._tree[parent] += tree._tree[i]
+        return tree
+
+    def add(self, i, delta):
+        while i <= self.size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, i):
+        """
+        Sum of positions 1..i
+        """
+        i = min(i, self.size)
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+class WaitingIndex:
+    def __init__(self, capacity=1024):
+        self._present = bytearray(capacity + 1)
+        self._tree = FenwickTree(capacity)
+        self._count = 0
+        self._lock = threading.RLock()
+        self.loaded = False
+        self.last_history_id = 0
+        self._gaps = {}  # missing history id -> when it was first missed
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, token_number):
+        return 0 < token_number < len(self._present) and bool(self._present[token_number])
+
+    def load(self, token_numbers, last_history_id=0, missing_ids=()):
+        with self._lock:
+            token_numbers = [n for n in token_numbers if n > 0]
+            self._present = bytearray(len(self._present))
+            if token_numbers and max(token_numbers) >= len(self._present):
+                self._grow(max(token_numbers))
+            for n in token_numbers:
+                self._present[n] = 1
+            self._tree = FenwickTree.from_counts(list(self._present[1:]))
+            self._count = sum(self._present)
+            self.last_history_id = last_history_id
+            now = time.monotonic()
+            self._gaps = {history_id: now for history_id in missing_ids}
+            self.loaded = True
+
+    def ensure_loaded(self, loader):
+        if not self.loaded:
+            with self._lock:
+                if not self.loaded:
+                    self.load(*loader())
+
+    def state(self):
+        """
+        (waiting token numbers in queue order, history id to replay from)
+        """
+        with self._lock:
+            # Replaying from below the oldest gap re-applies some rows, which
+            # leaves every token in the state of its latest action anyway.
+            replay_from = min(self._gaps) - 1 if self._gaps else self.last_history_id
+            return [n for n in range(1, len(self._present)) if self._present[n]], replay_from
+
+    def gaps(self):
+        with self._lock:
+            now = time.monotonic()
+            self._gaps = {i: t for i, t in self._gaps.items() if now - t < GAP_TIMEOUT}
+            return list(self._gaps)
+
+    def apply_history(self, rows):
+        """
+        Apply (id, action, token_number) rows in id order, skipping any that
+        were already applied
+        """
+        with self._lock:
+            now = time.monotonic()
+            for history_id, action, token_number in rows:
+                if self._gaps.pop(history_id, None) is None:
+                    if history_id <= self.last_history_id:
+                        continue
+                    first_missing = max(self.last_history_id + 1, history_id - MAX_GAPS)
+                    for missing in range(first_missing, history_id):
+                        self._gaps[missing] = now
+                    self.last_history_id = history_id
+                if action in ADD_ACTIONS:
+                    self.add(token_number)
+                elif action in REMOVE_ACTIONS:
+                    self.remove(token_number)
+
+    def add(self, token_number):
+        with self._lock:
+            if token_number >= len(self._present):
+                self._grow(token_number)
+            if self._present[token_number]:
+                return False
+            self._present[token_number] = 1
+            self._tree.add(token_number, 1)
+            self._count += 1
+            return True
+
+    def remove(self, token_number):
+        with self._lock:
+            if token_number not in self:
+                return False
+            self._present[token_number] = 0
+            self._tree.add(token_number, -1)
+            self._count -= 1
+            return True
+
+    def ahead(self, token_number):
+        """
+        Number of waiting tokens with a lower token number
+        """
+        with self._lock:
+            return self._tree.prefix_sum(token_number - 1)
+
+    def _grow(self, token_number):
+        capacity = len(self._present) - 1
+        while capacity < token_number:
+            capacity *= 2
+        self._present.extend(bytes(capacity + 1 - len(self._present)))
+        self._tree = FenwickTree.from_counts(list(self._present[1:]))
+
+def init_queue_index(app):
+    app.extensions['waiting_index'] = WaitingIndex()
+
+def snapshot_path(app):
+    return app.config.get('QUEUE_SNAPSHOT_PATH') or os.path.join(app.instance_path, 'queue_state.snap')
+
+def database_id():
+    """
+    Digest of the database URL and its first queue_history row, which tells
+    apart both different databases and a recreated one at the same URL
+    """
+    first = db.session.query(QueueHistory.id, QueueHistory.created_at)\
+        .order_by(QueueHistory.id)\
+        .first()
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(db.engine.url.render_as_string(hide_password=True).encode())
+    digest.update(repr(tuple(first) if first else None).encode())
+    return digest.digest()
+
+def save_waiting_index(app):
+    index = app.extensions['waiting_index']
+    if index.loaded:
+        with app.app_context():
+            save_snapshot(snapshot_path(app), *index.state(), database_id())
+
+def _load_state():
+    app = current_app._get_current_object()
+    latest_id = db.session.query(db.func.max(QueueHistory.id)).scalar() or 0
+
+    snapshot = load_snapshot(snapshot_path(app), database_id())
+    # A snapshot ahead of the log cannot be replayed from it
+    if snapshot is None or snapshot[1] > latest_id:
+        # Read the log position before the tokens, so anything committed in
+        # between is replayed rather than missed.
+        waiting = [n for (n,) in db.session.query(Token.token_number).filter_by(status='waiting')]
+        snapshot = (waiting, latest_id)
+
+    atexit.register(save_waiting_index, app)
+    return (*snapshot, _missing_ids(snapshot[1]))
+
+def _missing_ids(last_history_id):
+    # Ids just below the starting point that have not committed yet
+    window_start = max(last_history_id - MAX_GAPS, 0)
+    present = {i for (i,) in db.session.query(QueueHistory.id).filter(QueueHistory.id > window_start)}
+    return [i for i in range(window_start + 1, last_history_id + 1) if i not in present]
+
+def sync_waiting_index(index):
+    newer = QueueHistory.id > index.last_history_id
+    gaps = index.gaps()
+    rows = db.session.query(QueueHistory.id, QueueHistory.action, QueueHistory.token_number)\
+        .filter(db.or_(newer, QueueHistory.id.in_(gaps)) if gaps else newer)\
+        .order_by(QueueHistory.id)\
+        .all()
+    if rows:
+        index.apply_history(rows)
+
+def get_waiting_index():
+    index = current_app.extensions['waiting_index']
+    index.ensure_loaded(_load_state)
+    sync_waiting_index(index)
+    return index
@@ -0,0 +1,97 @@
+from flask import current_app, request, session, jsonify
+from functools import wraps
+import math
+import threading
+import time
+
+from redis_client import redis_client
+
+# Token-bucket rate limiting. Each (scope, user) and (scope, ip) pair owns a
+# bucket of `capacity` requests that refills continuously over `period`
+# seconds. Buckets live in process memory unless REDIS_URL points at
+# a Redis server, in which case every worker shares them.
+
+class MemoryBackend:
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, rate, now):
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                allowed, retry_after = True, 0
+            else:
+                self._buckets[key] = (tokens, now)
+                allowed, retry_after = False, (1 - tokens) / rate
+
+            if len(self._buckets) > self.max_keys:
+                self._prune(capacity, rate, now)
+            return allowed, retry_after
+
+    def _prune(self, capacity, rate, now):
+        # A bucket idle long enough to be full again carries no state.
+        idle = capacity / rate
+        for key, (_, updated) in list(self._buckets.items()):
+            if now - updated >= idle:
+                del self._buckets[key]
+
+class RedisBackend:
+    SCRIPT = '''
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens') or ARGV[1])
+local updated = tonumber(redis.call('HGET', KEYS[1], 'updated') or ARGV[3])
+local capacity, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+tokens = math.min(capacity, tokens + (now - updated) * rate)
+local allowed, retry_after = 0, (1 - tokens) / rate
+if tokens >= 1 then
+    tokens, allowed, retry_after = tokens - 1, 1, 0
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(retry_after)}
+'''
+
+    def __init__(self, url):
+        self._script = redis_client(url).register_script(self.SCRIPT)
+
+    def consume(self, key, capacity, rate, now):
+        allowed, retry_after = self._script(keys=[f'ratelimit:{key}'], args=[capacity, rate, now])
+        return bool(allowed), float(retry_after)
+
+def init_rate_limiter(app):
+    url = app.config.get('REDIS_URL')
+    app.extensions['rate_limiter'] = RedisBackend(url) if url else MemoryBackend()
+
+def rate_limited(scope):
+    """
+    Shed requests over the per-user and per-IP limits configured in
+    RATE_LIMITS[scope] before the view runs any query
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            limits = current_app.config['RATE_LIMITS'].get(scope, {})
+            backend = current_app.extensions['rate_limiter']
+            now = time.time()
+
+            identities = {'user': session.get('user_id'), 'ip': request.remote_addr}
+            for kind, identity in identities.items():
+                if kind not in limits or identity is None:
+                    continue
+                capacity, period = limits[kind]
+                allowed, retry_after = backend.consume(
+                    f'{scope}:{kind}:{identity}', capacity, capacity / period, now
+                )
+                if not allowed:
+                    response = jsonify({
+                        'success': False,
+                        'error': 'Too many requests, please try again shortly'
+                    })
+                    response.headers['Retry-After'] = str(math.ceil(retry_after))
+                    return response, 429
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
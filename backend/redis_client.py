@@ -0,0 +1,13 @@
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def redis_client(url):
+    """
+    Redis client for REDIS_URL, shared by the rate limiter, idempotency keys
+    and unread counts so they use one connection pool
+    """
+    try:
+        import redis
+    except ImportError:
+        raise RuntimeError('REDIS_URL requires the redis package')
+    return redis.Redis.from_url(url)
@@ -0,0 +1,53 @@
+from array import array
+import os
+import struct
+import sys
+
+# Compact on-disk snapshot of the waiting index: a fixed header followed by
+# the waiting token numbers in queue order as little-endian uint32. A
+# restarted worker loads it and only replays queue_history rows newer than
+# `last_history_id`, instead of rebuilding its state from the tokens table.
+# `database_id` is an opaque 16-byte digest identifying the database the
+# snapshot was taken from, so a snapshot of another database is ignored.
+
+MAGIC = b'QSNP'
+VERSION = 2
+HEADER = struct.Struct('<4sH16sqI')  # magic, version, database_id, last_history_id, waiting count
+
+def save_snapshot(path, token_numbers, last_history_id, database_id):
+    numbers = array('I', token_numbers)
+    if sys.byteorder != 'little':
+        numbers.byteswap()
+
+    # Write to a private temp file and rename, so readers never see a partial file
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, database_id, last_history_id, len(numbers)))
+        f.write(numbers.tobytes())
+    os.replace(tmp_path, path)
+
+def load_snapshot(path, database_id):
+    """
+    Return (token_numbers, last_history_id), or None when the file is
+    missing, not a valid snapshot or taken from another database
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    if len(data) < HEADER.size:
+        return None
+    magic, version, snapshot_database_id, last_history_id, count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or len(data) != HEADER.size + count * 4:
+        return None
+    if snapshot_database_id != database_id:
+        return None
+
+    numbers = array('I')
+    numbers.frombytes(data[HEADER.size:])
+    if sys.byteorder != 'little':
+        numbers.byteswap()
+    return numbers.tolist(), last_history_id
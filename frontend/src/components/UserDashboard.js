@@ -4,6 +4,9 @@ function UserDashboard({ user, onLogout }) {
   const [queueStatus, setQueueStatus] = useState(null);
   const [myTokens, setMyTokens] = useState([]);
   const [mySuggestions, setMySuggestions] = useState([]);
+  const [suggestionsCursor, setSuggestionsCursor] = useState(null);
+  const [olderSuggestionsCursor, setOlderSuggestionsCursor] = useState(null);
+  const [unreadSuggestions, setUnreadSuggestions] = useState(0);
   const [notifications, setNotifications] = useState([]);
   const [loading, setLoading] = useState(false);
   const [activeTab, setActiveTab] = useState('queue');
@@ -28,6 +31,19 @@ function UserDashboard({ user, onLogout }) {
     return () => clearInterval(interval);
   }, []);
 
+  useEffect(() => {
+    // Only download suggestions newer than the ones already shown
+    if (suggestionsCursor === null) return;
+    const interval = setInterval(syncSuggestions, 5000);
+    return () => clearInterval(interval);
+  }, [suggestionsCursor]);
+
+  useEffect(() => {
+    if (activeTab === 'suggestions' && unreadSuggestions > 0) {
+      markSuggestionsRead();
+    }
+  }, [activeTab, unreadSuggestions]);
+
   const checkAuth = async () => {
     try {
       const response = await fetch('http://localhost:5000/api/auth/me', {
@@ -81,9 +97,10 @@ function UserDashboard({ user, onLogout }) {
     }
   };
 
-  const fetchMySuggestions = async () => {
+  const fetchMySuggestions = async (before = null) => {
     try {
-      const response = await fetch('http://localhost:5000/api/user/my-suggestions', {
+      const url = 'http://localhost:5000/api/user/my-suggestions' + (before ? `?before=${before}` : '');
+      const response = await fetch(url, {
         credentials: 'include'
       });
       
@@ -94,13 +111,53 @@ function UserDashboard({ user, onLogout }) {
       
       const data = await response.json();
       if (data.success) {
-        setMySuggestions(data.suggestions);
+        if (before) {
+          setMySuggestions(prev => [...prev, ...data.suggestions]);
+        } else {
+          setMySuggestions(data.suggestions);
+          setSuggestionsCursor(data.suggestions.length > 0 ? data.suggestions[0].id : 0);
+        }
+        setOlderSuggestionsCursor(data.next_cursor);
+        setUnreadSuggestions(data.unread_count);
       }
     } catch (error) {
       console.error('Error fetching suggestions:', error);
     }
   };
 
+  const syncSuggestions = async () => {
+    try {
+      const response = await fetch(`http://localhost:5000/api/user/my-suggestions?since=${suggestionsCursor}`, {
+        credentials: 'include'
+      });
+      const data = await response.json();
+      if (data.success) {
+        if (data.suggestions.length > 0) {
+          setMySuggestions(prev => [...data.suggestions.reverse(), ...prev]);
+        }
+        setSuggestionsCursor(data.cursor);
+        setUnreadSuggestions(data.unread_count);
+      }
+    } catch (error) {
+      console.error('Error syncing suggestions:', error);
+    }
+  };
+
+  const markSuggestionsRead = async () => {
+    try {
+      const response = await fetch('http://localhost:5000/api/user/suggestions/mark-read', {
+        method: 'PUT',
+        credentials: 'include'
+      });
+      const data = await response.json();
+      if (data.success) {
+        setUnreadSuggestions(data.unread_count);
+      }
+    } catch (error) {
+      console.error('Error marking suggestions read:', error);
+    }
+  };
+
   const fetchNotifications = async () => {
     try {
       const response = await fetch('http://localhost:5000/api/user/notifications', {
@@ -253,6 +310,9 @@ function UserDashboard({ user, onLogout }) {
           onClick={() => setActiveTab('suggestions')}
         >
           My Suggestions
+          {unreadSuggestions > 0 && (
+            <span className="notification-badge">{unreadSuggestions}</span>
+          )}
         </button>
         <button 
           className={activeTab === 'notifications' ? 'active' : ''}
@@ -378,6 +438,11 @@ function UserDashboard({ user, onLogout }) {
               ) : (
                 <p className="no-data">No suggestions found</p>
               )}
+              {olderSuggestionsCursor && (
+                <button onClick={() => fetchMySuggestions(olderSuggestionsCursor)}>
+                  Load older suggestions
+                </button>
+              )}
             </div>
           </div>
         )}
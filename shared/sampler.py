@@ -0,0 +1,147 @@
+from collections import Counter
+from datetime import datetime
+import os
+import re
+import sys
+import threading
+import time
+
+# Statistical stack sampler behind the on-demand route profiling of both the
+# backend and the AI agent; each service's profiling.py puts this directory on
+# sys.path.
+#
+# An admin arms a route for its next N requests. While one of them is in
+# flight, the threads tracked for it are sampled from sys._current_frames()
+# every `interval` seconds, and when the last one finishes the samples are
+# written as a collapsed-stack file (one "frame;frame;frame count" line per
+# stack) that flamegraph.pl, speedscope and similar tools read directly.
+# Nothing is sampled while no route is armed: requests only check that the
+# armed dict is empty.
+
+class StackSampler:
+    def __init__(self, interval):
+        self.interval = interval
+        self._tracked = Counter()  # (thread id, tag, label) -> how many times tracked
+        self._samples = Counter()  # (tag, stack) -> count
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def track(self, tag, label=None):
+        """
+        Sample the calling thread under tag until untrack(); label, when
+        given, is added as the root frame of its stacks
+        """
+        with self._lock:
+            self._tracked[(threading.get_ident(), tag, label)] += 1
+            # The sampler thread exits when nothing is tracked, so start it again
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='profiler-sampler', daemon=True)
+                self._thread.start()
+
+    def untrack(self, tag, label=None):
+        with self._lock:
+            key = (threading.get_ident(), tag, label)
+            self._tracked[key] -= 1
+            if self._tracked[key] <= 0:
+                del self._tracked[key]
+
+    def take(self, tag):
+        """
+        Remove and return the samples collected for tag
+        """
+        with self._lock:
+            samples = Counter({stack: n for (t, stack), n in self._samples.items() if t == tag})
+            for stack in samples:
+                del self._samples[(tag, stack)]
+            return samples
+
+    def _loop(self):
+        while True:
+            with self._lock:
+                if not self._tracked:
+                    self._thread = None
+                    return
+                frames = sys._current_frames()
+                for thread_id, tag, label in self._tracked:
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stack = collapse_stack(frame)
+                        self._samples[(tag, f'{label};{stack}' if label else stack)] += 1
+            del frames
+            time.sleep(self.interval)
+
+def collapse_stack(frame):
+    names = []
+    while frame is not None:
+        names.append(f'{frame.f_globals.get("__name__", "?")}.{frame.f_code.co_qualname}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+class RouteProfiler:
+    """
+    Profiles the next N requests to each armed route; the file for a route is
+    written when its last armed request finishes
+    """
+
+    def __init__(self, output_dir, interval):
+        self.output_dir = output_dir
+        self.sampler = StackSampler(interval)
+        self.armed = {}  # route -> requests left to profile
+        self.profiles = []  # file names written so far, oldest first
+        self._in_flight = Counter()
+        self._lock = threading.Lock()
+
+    def arm(self, route, requests):
+        with self._lock:
+            self.armed[route] = requests
+
+    def disarm(self, route):
+        """
+        Stop profiling route; returns the file written from the samples
+        collected so far, if any
+        """
+        with self._lock:
+            self.armed.pop(route, None)
+            if self._in_flight[route]:
+                return None
+        return self._write(route)
+
+    def begin(self, route, label=None):
+        """
+        Claim one armed request for route and track the calling thread;
+        False when route is not armed
+        """
+        with self._lock:
+            left = self.armed.get(route)
+            if not left:
+                return False
+            if left == 1:
+                del self.armed[route]
+            else:
+                self.armed[route] = left - 1
+            self._in_flight[route] += 1
+        self.sampler.track(route, label)
+        return True
+
+    def end(self, route, label=None):
+        self.sampler.untrack(route, label)
+        with self._lock:
+            self._in_flight[route] -= 1
+            if self._in_flight[route] or route in self.armed:
+                return
+            del self._in_flight[route]
+        self._write(route)
+
+    def _write(self, route):
+        samples = self.sampler.take(route)
+        if not samples:
+            return None
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', route).strip('_') or 'root'
+        name = f'{slug}-{datetime.utcnow().strftime("%Y%m%d-%H%M%S-%f")}-{os.getpid()}.folded'
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(os.path.join(self.output_dir, name), 'w') as f:
+            for stack, count in samples.most_common():
+                f.write(f'{stack} {count}\n')
+        with self._lock:
+            self.profiles.append(name)
+        return name